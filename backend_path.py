@@ -0,0 +1,10 @@
+"""
+根目录脚本与后端共用 fund-web-app/backend 下的模块（http_pool、market_hours 等）
+在导入这些模块之前 import backend_path，把后端目录加入 sys.path
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fund-web-app", "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
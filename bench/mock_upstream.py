@@ -0,0 +1,242 @@
+"""
+本地模拟上游服务器，用于离线压测
+模拟同花顺分时 (gz-fund.10jqka.com.cn)、天天基金估值 jsonp (fundgz.1234567.com.cn)、
+基金搜索 (fundsuggest.eastmoney.com)、基金列表 (fund.eastmoney.com)、持仓明细 (fundf10.eastmoney.com)
+和东财 clist 行情、ulist/sse 推送行情 (push2.eastmoney.com)
+
+用法:
+    python bench/mock_upstream.py --port 9100 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+后端通过 UPSTREAM_OVERRIDE="*=http://127.0.0.1:9100" 指向本服务器
+"""
+import json
+import zlib
+import random
+import asyncio
+import argparse
+import datetime
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
+
+COMPANIES = ['易方达', '华夏', '广发', '南方', '嘉实', '博时', '汇添富', '富国', '招商', '工银瑞信',
+             '永赢', '国泰', '天弘', '鹏华', '银华', '兴全', '摩根', '华安', '景顺长城', '中欧']
+THEMES = ['沪深300', '中证500', '半导体', '医药创新', '新能源', '消费', '黄金', '纳斯达克100', '标普500',
+          '有色金属', '储能电池', '稀土产业', '红利低波', '集成电路', '恒生科技', '先进制造', '高端装备']
+KINDS = ['ETF联接', '混合', '股票', '债券', '指数(QDII)', '智选混合', '指数增强']
+
+
+class MockConfig:
+    latency_ms = 50.0
+    jitter_ms = 20.0
+    error_rate = 0.0
+    points = 241          # 分时曲线点数（全天 241 个）
+    universe = 20000      # 模拟基金总数
+    pad_bytes = 0         # 每个响应额外填充的字节数，用于模拟更大的报文
+    tick_ms = 500.0       # 推送行情的推送间隔
+    tick_share = 0.2      # 每次推送中有变化的股票比例
+
+
+config = MockConfig()
+calls = Counter()
+
+
+def fund_code(i):
+    return f"{i:06d}"
+
+
+def fund_name(i):
+    rnd = random.Random(i)
+    return f"{rnd.choice(COMPANIES)}{rnd.choice(THEMES)}{rnd.choice(KINDS)}{'AC'[i % 2]}{i}"
+
+
+def prev_nav(code):
+    return 1 + (zlib.crc32(code.encode()) % 3000) / 1000
+
+
+def curve_value(code, minute):
+    base = prev_nav(code)
+    return base * (1 + ((zlib.crc32(f"{code}{minute}".encode()) % 400) - 200) / 100000 * (1 + minute / 60))
+
+
+def session_minutes():
+    """09:30-11:30, 13:00-15:00 的 HHMM 列表"""
+    result = []
+    for start, end in ((570, 690), (780, 900)):
+        for m in range(start, end + 1):
+            result.append(f"{m // 60:02d}{m % 60:02d}")
+    return result
+
+
+MINUTES = session_minutes()
+
+
+async def upstream_delay(kind):
+    """模拟网络延迟及随机错误，返回 True 表示本次应返回错误"""
+    calls[kind] += 1
+    delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+    await asyncio.sleep(delay)
+    return random.random() < config.error_rate
+
+
+def padding():
+    return " " * config.pad_bytes if config.pad_bytes else ""
+
+
+app = FastAPI()
+
+
+@app.get("/")
+async def ths_chart(request: Request):
+    """同花顺分时: ?module=api&controller=index&action=chart&info=vm_fd_XXXXXX&start=HHMM"""
+    if await upstream_delay("ths"):
+        return PlainTextResponse("error", status_code=500)
+    info = request.query_params.get("info", "")
+    start = request.query_params.get("start", "0930")
+    code = info.replace("vm_fd_", "")
+    today = datetime.date.today().isoformat()
+    minutes = [m for m in MINUTES[:config.points] if m >= start]
+    nav = prev_nav(code)
+    points = ";".join(f"{m},{curve_value(code, i):.5f},{nav:.4f},0.000" for i, m in enumerate(minutes))
+    return PlainTextResponse(f"{info}='{code}|{today}~{nav:.4f}~0930,{points}'{padding()}")
+
+
+@app.get("/js/fundcode_search.js")
+async def fund_list():
+    calls["fundlist"] += 1
+    rows = [[fund_code(i), "MOCK", fund_name(i), "混合型", "MOCK"] for i in range(1, config.universe + 1)]
+    return PlainTextResponse("var r = " + json.dumps(rows, ensure_ascii=False) + ";")
+
+
+@app.get("/js/{code}.js")
+async def fundgz(code: str):
+    if await upstream_delay("fundgz"):
+        return PlainTextResponse("error", status_code=500)
+    nav = prev_nav(code)
+    gsz = curve_value(code, min(config.points, len(MINUTES)) - 1)
+    data = {
+        "fundcode": code,
+        "name": fund_name(int(code)) if code.isdigit() else code,
+        "jzrq": (datetime.date.today() - datetime.timedelta(days=1)).isoformat(),
+        "dwjz": f"{nav:.4f}",
+        "gsz": f"{gsz:.4f}",
+        "gszzl": f"{(gsz / nav - 1) * 100:.2f}",
+        "gztime": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+    return PlainTextResponse(f"jsonpgz({json.dumps(data, ensure_ascii=False)});{padding()}")
+
+
+@app.get("/FundSearch/api/FundSearchAPI.ashx")
+async def fund_search(key: str = ""):
+    if await upstream_delay("fundsuggest"):
+        return PlainTextResponse("error", status_code=500)
+    i = zlib.crc32(key.encode()) % config.universe + 1
+    return JSONResponse({"Datas": [{"CODE": fund_code(i), "NAME": fund_name(i)}]})
+
+
+@app.get("/FundArchivesDatas.aspx")
+async def fund_holdings(code: str = "", topline: int = 10):
+    """持仓明细: 最近两个季度各一张表，偶数季度（半年报/年报）给出全部持仓"""
+    if await upstream_delay("jjcc"):
+        return PlainTextResponse("error", status_code=500)
+    today = datetime.date.today()
+    year, quarter = today.year, (today.month - 1) // 3
+    if quarter == 0:
+        year, quarter = year - 1, 4
+    rnd = random.Random(code)
+    tables = []
+    for y, q in ((year, quarter), (year - (quarter == 1), (quarter - 2) % 4 + 1)):
+        count = min(topline, 10 if q % 2 else 10 + rnd.randint(10, 40))
+        rows = "".join(
+            f"<tr><td>{i + 1}</td><td><a href='#'>{600000 + rnd.randint(0, 3999):06d}</a></td>"
+            f"<td class='tol'><a href='#'>股票{i}</a></td><td class='tor'><span></span></td>"
+            f"<td class='tor'><span></span></td><td class='xglj'>变动详情</td>"
+            f"<td class='tor'>{rnd.uniform(0.1, 9):.2f}%</td><td class='tor'>12.34</td><td class='tor'>567.89</td></tr>"
+            for i in range(count))
+        tables.append(f"<div class='box'><h4 class='t'>{y}年{q}季度股票投资明细</h4>"
+                      f"<table><thead><tr><th>序号</th></tr></thead><tbody>{rows}</tbody></table></div>")
+    content = "".join(tables)
+    return PlainTextResponse(f'var apidata={{ content:"{content}",arryear:[{year}],curyear:{year}}};')
+
+
+def stock_row(secid):
+    market, _, code = secid.partition(".")
+    change = ((zlib.crc32(code.encode()) + int(datetime.datetime.now().timestamp() // 3)) % 2000 - 1000) / 100
+    price = 10 + zlib.crc32(secid.encode()) % 5000 / 100
+    return {"f12": code, "f13": int(market), "f14": f"股票{code}", "f2": price, "f3": change,
+            "f4": round(price * change / 100, 2), "f5": 100000, "f6": 1.5e9}
+
+
+@app.get("/api/qt/ulist/sse")
+async def ulist_sse(secids: str = ""):
+    """推送行情：先推全量，之后每 tick_ms 推一次，只带有变化的行（按位置编号）及变化的字段"""
+    if await upstream_delay("ulist_sse"):
+        return PlainTextResponse("error", status_code=500)
+    rows = [stock_row(secid) for secid in secids.split(",") if secid]
+
+    def event(diff):
+        return f"data: {json.dumps({'rc': 0, 'data': {'total': len(rows), 'diff': diff}}, ensure_ascii=False)}\n\n"
+
+    async def events():
+        yield event({str(i): row for i, row in enumerate(rows)})
+        while True:
+            await asyncio.sleep(config.tick_ms / 1000)
+            calls["ulist_tick"] += 1
+            diff = {}
+            for i in random.sample(range(len(rows)), max(1, int(len(rows) * config.tick_share))) if rows else []:
+                row = rows[i]
+                row["f3"] = round(row["f3"] + random.choice((-1, 1)) * random.randint(1, 20) / 100, 2)
+                row["f2"] = round(row["f2"] * (1 + random.uniform(-0.001, 0.001)), 2)
+                diff[str(i)] = {"f2": row["f2"], "f3": row["f3"]}
+            yield event(diff)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/api/qt/clist/get")
+async def clist(fs: str = "", pz: int = 20, pn: int = 1):
+    if await upstream_delay("clist"):
+        return PlainTextResponse("error", status_code=500)
+    secids = [s[2:] for s in fs.split(",") if s.startswith("i:")]
+    diff = [stock_row(secid) for secid in secids]
+    page = diff[(pn - 1) * pz:pn * pz]
+    return JSONResponse({"data": {"total": len(diff), "diff": page} if page else None})
+
+
+@app.get("/__stats")
+async def stats():
+    """各接口被调用次数"""
+    return dict(calls)
+
+
+@app.post("/__reset")
+async def reset():
+    calls.clear()
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟上游行情服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=config.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--points", type=int, default=config.points, help="分时曲线点数")
+    parser.add_argument("--universe", type=int, default=config.universe, help="模拟基金总数")
+    parser.add_argument("--pad-bytes", type=int, default=config.pad_bytes, help="每个响应额外填充字节")
+    parser.add_argument("--tick-ms", type=float, default=config.tick_ms, help="推送行情的推送间隔")
+    args = parser.parse_args()
+    config.latency_ms = args.latency_ms
+    config.jitter_ms = args.jitter_ms
+    config.error_rate = args.error_rate
+    config.points = args.points
+    config.universe = args.universe
+    config.pad_bytes = args.pad_bytes
+    config.tick_ms = args.tick_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+离线压测：启动本地模拟上游和后端，按不同基金数量与并发客户端数压测 /api/resolve 和 /api/refresh
+输出吞吐量、p50/p99 延迟以及每次请求触发的上游调用次数
+
+用法:
+    python bench/run_bench.py --sizes 100,1000,10000 --clients 1,10,50 --rounds 3
+    python bench/run_bench.py --latency-ms 200 --error-rate 0.05 --ttl 0
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "fund-web-app", "backend")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_upstream import fund_code, fund_name
+
+
+def start_process(args, env=None, cwd=None):
+    return subprocess.Popen(args, env={**os.environ, **(env or {})}, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务未就绪: {url}")
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def make_portfolio(size, universe, seed):
+    rnd = random.Random(seed)
+    ids = [rnd.randint(1, universe) for _ in range(size)]
+    return [{"code": fund_code(i), "name": fund_name(i), "amount": round(rnd.uniform(100, 50000), 2)} for i in ids]
+
+
+def make_resolve_text(portfolio, name_ratio=0.3):
+    """部分行只有名称没有代码，覆盖名称识别路径"""
+    lines = []
+    for i, f in enumerate(portfolio):
+        if i % 10 < name_ratio * 10:
+            lines.append(f"{f['name']}: {f['amount']}")
+        else:
+            lines.append(f"{f['code']} {f['amount']}")
+    return "\n".join(lines)
+
+
+async def run_scenario(backend, mock, endpoint, size, clients, rounds, universe):
+    """clients 个客户端各自持有 size 支基金，每个客户端连续请求 rounds 次"""
+    async with httpx.AsyncClient(timeout=300) as mock_client:
+        await mock_client.post(f"{mock}/__reset")
+
+    latencies = []
+    errors = 0
+
+    async def client_loop(client_id):
+        nonlocal errors
+        portfolio = make_portfolio(size, universe, seed=f"{endpoint}-{size}-{client_id}")
+        text = make_resolve_text(portfolio)
+        async with httpx.AsyncClient(timeout=300) as client:
+            for _ in range(rounds):
+                started = time.perf_counter()
+                try:
+                    if endpoint == "resolve":
+                        response = await client.post(f"{backend}/api/resolve", json={"text": text})
+                    else:
+                        response = await client.post(f"{backend}/api/refresh", json=portfolio)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    async with httpx.AsyncClient() as mock_client:
+        upstream = (await mock_client.get(f"{mock}/__stats")).json()
+    requests_done = len(latencies)
+    upstream_total = sum(upstream.values())
+    return {
+        "endpoint": endpoint,
+        "size": size,
+        "clients": clients,
+        "requests": requests_done,
+        "errors": errors,
+        "req_per_s": requests_done / elapsed if elapsed else 0.0,
+        "funds_per_s": requests_done * size / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "upstream_per_req": upstream_total / requests_done if requests_done else 0.0,
+    }
+
+
+def format_row(r):
+    return (f"{r['endpoint']:<8} {r['size']:>6} {r['clients']:>7} {r['requests']:>5} {r['errors']:>4} "
+            f"{r['req_per_s']:>8.2f} {r['funds_per_s']:>10.0f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+            f"{r['upstream_per_req']:>10.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="基金估值后端离线压测")
+    parser.add_argument("--sizes", default="100,1000,10000", help="每个客户端持有的基金数")
+    parser.add_argument("--clients", default="1,10,50", help="并发客户端数")
+    parser.add_argument("--rounds", type=int, default=3, help="每个客户端连续请求次数")
+    parser.add_argument("--endpoints", default="resolve,refresh")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--points", type=int, default=241)
+    parser.add_argument("--universe", type=int, default=20000)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--ttl", type=float, default=60, help="后端行情缓存 TTL（秒），0 表示每次都请求上游")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--backend-port", type=int, default=8100)
+    parser.add_argument("--output", help="同时将结果写入该文件")
+    args = parser.parse_args()
+
+    mock = f"http://127.0.0.1:{args.mock_port}"
+    backend = f"http://127.0.0.1:{args.backend_port}"
+    data_dir = os.path.join(ROOT, ".bench_data")
+    os.makedirs(data_dir, exist_ok=True)
+    for name in ("snapshot.db", "snapshot.db-wal", "snapshot.db-shm", "fund_directory.json"):
+        if os.path.exists(os.path.join(data_dir, name)):
+            os.remove(os.path.join(data_dir, name))
+
+    processes = [start_process([
+        sys.executable, os.path.join(ROOT, "bench", "mock_upstream.py"),
+        "--port", str(args.mock_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--points", str(args.points),
+        "--universe", str(args.universe), "--pad-bytes", str(args.pad_bytes),
+    ])]
+    try:
+        await wait_ready(f"{mock}/__stats")
+        processes.append(start_process(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.backend_port), "--log-level", "warning"],
+            env={
+                "UPSTREAM_OVERRIDE": f"*={mock}",
+                "QUOTE_CACHE_TTL": str(args.ttl),
+                "POLLER_ENABLED": "0",
+                "UNIVERSE_ENABLED": "0",
+                "SNAPSHOT_DB": os.path.join(data_dir, "snapshot.db"),
+                "FUND_DIRECTORY_PATH": os.path.join(data_dir, "fund_directory.json"),
+            },
+            cwd=BACKEND_DIR,
+        ))
+        await wait_ready(f"{backend}/api/cache/stats")
+        # 等待后端首次下载基金目录
+        await asyncio.sleep(2)
+
+        header = (f"{'接口':<8} {'基金数':>6} {'客户端':>7} {'请求':>5} {'错误':>4} "
+                  f"{'请求/秒':>8} {'基金/秒':>10} {'p50(ms)':>9} {'p99(ms)':>9} {'上游/请求':>10}")
+        out = [f"上游延迟 {args.latency_ms}±{args.jitter_ms}ms, 错误率 {args.error_rate}, 缓存 TTL {args.ttl}s", header, "-" * 100]
+        print("\n".join(out))
+        for endpoint in args.endpoints.split(","):
+            for size in (int(s) for s in args.sizes.split(",")):
+                for clients in (int(c) for c in args.clients.split(",")):
+                    result = await run_scenario(backend, mock, endpoint, size, clients, args.rounds, args.universe)
+                    line = format_row(result)
+                    print(line)
+                    out.append(line)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write("\n".join(out) + "\n")
+    finally:
+        for p in processes:
+            p.terminate()
+            p.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,25 +1,36 @@
-import urllib.request
-import json
+import sys
+import time
+import asyncio
+import argparse
 import datetime
+import contextlib
+import unicodedata
 
-def fetch_market_data():
+import backend_path
+import http_pool
+import market_hours
+from fund_valuation import get_fund_info
+
+# 1.000001: 上证指数
+# 0.399001: 深证成指
+# 0.399006: 创业板指
+# 1.000688: 科创50
+# 0.899050: 北证50
+INDEX_SECIDS = ["1.000001", "0.399001", "0.399006", "1.000688", "0.899050"]
+
+async def fetch_market_data(secids=None):
     # 使用 clist/get 接口，通过 fs=i:market.code 的方式指定多个指数
-    # 1.000001: 上证指数
-    # 0.399001: 深证成指
-    # 0.399006: 创业板指
-    # 1.000688: 科创50
-    # 0.899050: 北证50
+    secids = secids or INDEX_SECIDS
     ut = "bd1d9ddb040897f350c061f0674230d7"
-    fs = "i:1.000001,i:0.399001,i:0.399006,i:1.000688,i:0.899050"
-    fields = "f2,f3,f4,f5,f6,f12,f14"
-    url = f"https://push2.eastmoney.com/api/qt/clist/get?pn=1&pz=10&po=1&np=1&ut={ut}&fltt=2&invt=2&fid=f3&fs={fs}&fields={fields}"
-    
+    fs = ",".join(f"i:{secid}" for secid in secids)
+    fields = "f2,f3,f4,f5,f6,f12,f13,f14"
+    url = f"https://push2.eastmoney.com/api/qt/clist/get?pn=1&pz={max(10, len(secids))}&po=1&np=1&ut={ut}&fltt=2&invt=2&fid=f3&fs={fs}&fields={fields}"
+
     try:
-        with urllib.request.urlopen(url) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            if data and data.get('data') and data['data'].get('diff'):
-                indices = data['data']['diff']
-                return indices
+        data = await http_pool.get_json(url)
+        if data and data.get('data') and data['data'].get('diff'):
+            indices = data['data']['diff']
+            return indices
     except Exception as e:
         print(f"Error fetching data: {e}")
     return None
@@ -38,39 +49,305 @@ def format_amount(amount):
         return f"{amount / 10000:.2f} 万"
     return str(amount)
 
-def main():
+def format_signed(value, suffix=""):
+    """数值保留两位小数，正数加 + 号；非数值原样输出"""
+    if not isinstance(value, (int, float)):
+        return str(value)
+    text = f"{value:.2f}{suffix}"
+    return "+" + text if value > 0 else text
+
+def format_row(name, price, change_percent, change_amount, extra):
+    """一行的各单元格文本：名称、最新价、涨跌幅、涨跌额、成交额（基金为估值时间）"""
+    if isinstance(extra, (int, float)):
+        extra = format_amount(extra)
+    return [str(name), str(price), format_signed(change_percent, "%"), format_signed(change_amount), str(extra)]
+
+async def main():
     print(f"--- 东方财富今日大盘数据 ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ---")
     print(f"{'名称':<10} {'最新价':<10} {'涨跌幅':<10} {'涨跌额':<10} {'成交额':<10}")
     print("-" * 60)
-    
-    indices = fetch_market_data()
+
+    indices = await fetch_market_data()
+    await http_pool.aclose()
     if indices:
         for index in indices:
-            name = index.get('f14', '-')
-            price = index.get('f2', '-')
-            change_percent = index.get('f3', '-')
-            change_amount = index.get('f4', '-')
-            amount = index.get('f6', 0)
-            
-            # 格式化涨跌幅
-            change_percent_str = f"{change_percent:.2f}%" if isinstance(change_percent, (int, float)) else str(change_percent)
-            if isinstance(change_percent, (int, float)) and change_percent > 0:
-                change_percent_str = "+" + change_percent_str
-                
-            # 格式化涨跌额
-            change_amount_str = f"{change_amount:.2f}" if isinstance(change_amount, (int, float)) else str(change_amount)
-            if isinstance(change_amount, (int, float)) and change_amount > 0:
-                change_amount_str = "+" + change_amount_str
-
-            # 格式化最新价 (通常需要除以 100，但对于指数 API，有时直接是原始值，需验证)
-            # 经查，东财 ulist/get 返回的 f2 通常已经是正确的小数形式，或者需要根据 dect 位处理。
-            # 这里我们直接打印，如果不正确再调整。
-            
-            formatted_amount = format_amount(amount)
-            
-            print(f"{name:<10} {str(price):<10} {change_percent_str:<10} {change_amount_str:<10} {formatted_amount:<10}")
+            # 东财 clist 接口 fltt=2 时 f2 已是小数形式的最新价
+            cells = format_row(index.get('f14', '-'), index.get('f2', '-'), index.get('f3', '-'),
+                               index.get('f4', '-'), index.get('f6', 0))
+            print(" ".join(f"{cell:<10}" for cell in cells))
     else:
         print("未能获取到数据，请检查网络或 API 状态。")
 
+
+# ---- 持续监控模式 (--watch) ----
+
+# 交易时段内的默认刷新间隔（秒）；休市时等到下一个交易时段，但每 IDLE_INTERVAL 秒仍刷新一次状态
+WATCH_INTERVAL = 3.0
+FUND_INTERVAL = 30.0
+IDLE_INTERVAL = 300.0
+
+COLUMNS = [("名称", 22), ("最新价", 10), ("涨跌幅", 9), ("涨跌额", 9), ("成交额/时间", 12)]
+HEADER_LINES = 3
+
+def display_width(text):
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+def fit(text, width, right=False):
+    """按终端显示宽度（中文占两列）截断并补齐空格"""
+    while display_width(text) > width:
+        text = text[:-1]
+    pad = " " * (width - display_width(text))
+    return pad + text if right else text + pad
+
+
+class WatchScreen:
+    """
+    终端增量刷新：首次画出整张表，之后只把光标移到变化的单元格重写，不重绘整屏
+    输出不是终端时（如重定向到文件）改为逐行打印变化的行
+    """
+
+    def __init__(self, keys, out=None):
+        self.keys = list(keys)
+        self.out = out or sys.stdout
+        self.ansi = self.out.isatty()
+        self.cells = {}       # key -> 上次输出的单元格文本
+        self.directions = {}  # key -> 上次涨跌方向，颜色变化时整行重写
+        self.offsets = []
+        x = 1
+        for _title, width in COLUMNS:
+            self.offsets.append(x)
+            x += width + 1
+        if self.ansi:
+            # 第 1 行为刷新时间，第 2、3 行为表头，数据从第 HEADER_LINES + 1 行开始
+            self.out.write("\x1b[2J\x1b[H\x1b[?25l\n")
+            self.out.write(" ".join(fit(title, width) for title, width in COLUMNS) + "\n")
+            self.out.write("-" * (x - 2) + "\n")
+
+    def _goto(self, row, col):
+        self.out.write(f"\x1b[{row};{col}H")
+
+    def _row(self, key):
+        return HEADER_LINES + 1 + self.keys.index(key)
+
+    def status(self, text):
+        if self.ansi:
+            self._goto(HEADER_LINES + len(self.keys) + 2, 1)
+            self.out.write(text + "\x1b[K")
+            self._goto(1, 1)
+            self.out.write(f"--- {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
+            self.out.flush()
+
+    def update(self, key, cells, direction=0):
+        """写入一行，返回实际重写的单元格数"""
+        if key not in self.keys:
+            self.keys.append(key)
+            if self.ansi:
+                # 表格变长后原状态行落在新行及其下一行，先清空
+                self._goto(self._row(key), 1)
+                self.out.write("\x1b[2K\x1b[1B\x1b[2K")
+        old = self.cells.get(key)
+        if direction != self.directions.get(key):
+            old = None
+        self.cells[key] = cells
+        self.directions[key] = direction
+        changed = [i for i, cell in enumerate(cells) if old is None or old[i] != cell]
+        if not changed:
+            return 0
+        if not self.ansi:
+            now = datetime.datetime.now().strftime('%H:%M:%S')
+            self.out.write(now + " " + " ".join(fit(c, w) for c, (_t, w) in zip(cells, COLUMNS)) + "\n")
+            self.out.flush()
+            return len(changed)
+        row = self._row(key)
+        color = {1: "\x1b[31m", -1: "\x1b[32m"}.get(direction, "")
+        for i in changed:
+            self._goto(row, self.offsets[i])
+            text = fit(cells[i], COLUMNS[i][1], right=i > 0)
+            self.out.write(f"{color}{text}\x1b[0m" if color and i > 0 else text)
+        self.out.flush()
+        return len(changed)
+
+    def message(self, text):
+        """错误等提示：终端模式写在状态行下一行，否则输出到 stderr，不打乱表格"""
+        if not self.ansi:
+            print(text, file=sys.stderr)
+            return
+        self._goto(HEADER_LINES + len(self.keys) + 3, 1)
+        self.out.write(f"{datetime.datetime.now().strftime('%H:%M:%S')} {text}\x1b[K")
+        self.out.flush()
+
+    def close(self):
+        if self.ansi:
+            self._goto(HEADER_LINES + len(self.keys) + 4, 1)
+            self.out.write("\x1b[?25h")
+            self.out.flush()
+
+
+class MessageWriter:
+    """替代 sys.stdout 的文件对象：持续刷新期间其他模块 print 的内容逐行转给 WatchScreen.message"""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                self.screen.message(line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class TickLog:
+    """
+    行情变化日志（制表符分隔文本，便于回放）：
+        =  key  名称                    首次出现时记录名称
+        时间戳  key  最新价  涨跌幅  涨跌额  成交额/估值时间    只记录有变化的行
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+        self.named = set()
+        self.last = {}
+
+    def write(self, key, name, values):
+        if key not in self.named:
+            self.named.add(key)
+            self.file.write(f"=\t{key}\t{name}\n")
+        if self.last.get(key) == values:
+            return
+        self.last[key] = values
+        self.file.write(f"{time.time():.1f}\t{key}\t" + "\t".join(str(v) for v in values) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def poll_interval(base):
+    """交易时段内按 base 秒刷新；休市时等到下一个交易时段（最长 IDLE_INTERVAL 秒）"""
+    if market_hours.in_session():
+        return base
+    return min(max(market_hours.seconds_until_session(), base), IDLE_INTERVAL)
+
+def direction_of(value):
+    if not isinstance(value, (int, float)):
+        return 0
+    return (value > 0) - (value < 0)
+
+async def fetch_fund_rows(fund_codes):
+    """
+    基金实时估值 {f:代码: (名称, 估值, 涨跌幅, 涨跌额, 估值时间)}
+    还没有估值（gsz 为空等无法解析）的基金各项显示为 "-"
+    """
+    infos = await asyncio.gather(*(get_fund_info(code) for code in fund_codes))
+    rows = {}
+    for code, info in zip(fund_codes, infos):
+        if not info:
+            continue
+        name, gztime = info.get('name') or code, str(info.get('gztime') or '')[-5:]
+        try:
+            gsz, dwjz = float(info['gsz']), float(info['dwjz'])
+            rows[f"f:{code}"] = (name, info['gsz'], float(info['gszzl']), round(gsz - dwjz, 4), gztime)
+        except (KeyError, TypeError, ValueError):
+            rows[f"f:{code}"] = (name, '-', '-', '-', gztime or '-')
+    return rows
+
+async def watch(secids, fund_codes, interval, fund_interval, log_path=None):
+    """持续刷新指数和基金估值；整个过程共用同一个事件循环及连接池，连接保持复用"""
+    keys = list(secids) + [f"f:{code}" for code in fund_codes]
+    screen = WatchScreen(keys)
+    log = TickLog(log_path) if log_path else None
+    fund_rows, fund_due = {}, 0.0
+    polls = 0
+    # 各模块出错时直接 print，刷新期间转到提示行（或 stderr），避免打乱增量绘制的表格
+    with contextlib.redirect_stdout(MessageWriter(screen)):
+        try:
+            while True:
+                started = time.monotonic()
+                redrawn = 0
+                try:
+                    rows = {}
+                    indices = await fetch_market_data(secids) if secids else None
+                    for index in indices or []:
+                        key = f"{index.get('f13')}.{index.get('f12')}"
+                        rows[key] = (index.get('f14', '-'), index.get('f2', '-'), index.get('f3', '-'),
+                                     index.get('f4', '-'), index.get('f6', 0))
+                    if fund_codes and started >= fund_due:
+                        fund_rows = await fetch_fund_rows(fund_codes)
+                        fund_due = started + fund_interval
+                    rows.update(fund_rows)
+                    for key, (name, *values) in rows.items():
+                        redrawn += screen.update(key, format_row(name, *values), direction_of(values[1]))
+                        if log:
+                            log.write(key, name, values)
+                except Exception as e:
+                    # 单次刷新失败不退出，下个周期重试
+                    screen.message(f"刷新失败: {e!r}")
+                polls += 1
+                wait = poll_interval(interval)
+                state = "交易中" if market_hours.in_session() else "休市"
+                screen.status(f"[{state}] 第 {polls} 次刷新，更新 {redrawn} 个单元格，"
+                              f"{wait:.0f} 秒后刷新 (Ctrl+C 退出)")
+                await asyncio.sleep(max(0.0, wait - (time.monotonic() - started)))
+        finally:
+            screen.close()
+            if log:
+                log.close()
+            await http_pool.aclose()
+
+async def replay(path, speed):
+    """按记录时的时间间隔（除以 speed）回放行情日志"""
+    names, screen, last_ts = {}, None, None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if parts[0] == "=":
+                names[parts[1]] = parts[2]
+                continue
+            ts, key, values = float(parts[0]), parts[1], [_number(v) for v in parts[2:]]
+            if screen is None:
+                screen = WatchScreen([])
+            if last_ts is not None and ts > last_ts:
+                await asyncio.sleep((ts - last_ts) / speed)
+            last_ts = ts
+            screen.update(key, format_row(names.get(key, key), *values), direction_of(values[1]))
+            screen.status(f"[回放] {datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')}")
+    if screen:
+        screen.close()
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="东方财富大盘指数及基金估值")
+    parser.add_argument("--watch", action="store_true", help="持续刷新，只重绘变化的单元格")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="交易时段内的刷新间隔（秒）")
+    parser.add_argument("--indices", default=",".join(INDEX_SECIDS),
+                        help="逗号分隔的指数 secid（市场编号.代码），默认五大指数，传空字符串不显示指数")
+    parser.add_argument("--funds", default="", help="逗号分隔的基金代码，显示实时估值")
+    parser.add_argument("--fund-interval", type=float, default=FUND_INTERVAL, help="基金估值刷新间隔（秒）")
+    parser.add_argument("--log", help="把每次变化追加写入该文件，供 --replay 回放")
+    parser.add_argument("--replay", help="回放 --log 记录的文件")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    try:
+        if args.replay:
+            asyncio.run(replay(args.replay, args.speed))
+        elif args.watch:
+            secids = [s.strip() for s in args.indices.split(",") if s.strip()]
+            funds = [c.strip() for c in args.funds.split(",") if c.strip()]
+            asyncio.run(watch(secids, funds, args.interval, args.fund_interval, args.log))
+        else:
+            asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,151 @@
+"""
+持仓估值的紧凑列式编码：每列一个数组，名称按代码只出现一次，不再逐行重复字段名
+- application/x-fund-columns：自描述二进制格式，只用标准库
+    "FC02" | u32 行数 | 字符串列 codes、versions | 名称表 | 浮点列（小端 float64，缺失为 NaN）| stale (u8) | 附加信息 (JSON)
+    字符串列与名称表均为 u32 个数 + 每个字符串的 u32 字节数 + 依次拼接的 UTF-8 文本（空字符串也占一项），
+    名称表为 代码、名称 交替排列
+- application/msgpack：相同的列式结构经 MessagePack 编码（需安装 msgpack）
+响应体较大时按 Accept-Encoding 压缩，br（需安装 brotli）优先，其次 gzip
+"""
+import gzip
+import json
+import math
+import sys
+import struct
+from array import array
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COLUMNS_TYPE = "application/x-fund-columns"
+MSGPACK_TYPE = "application/msgpack"
+MAGIC = b"FC02"
+FLOAT_COLUMNS = ("realtimeChange", "realtimeProfit", "holdProfit", "amount", "age")
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = 1024
+
+
+class Columns:
+    """按列累积的持仓行"""
+
+    def __init__(self):
+        self.codes = []
+        self.versions = []
+        self.names = {}
+        self.floats = {name: [] for name in FLOAT_COLUMNS}
+        self.stale = []
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, code, version, stale, *values):
+        self.codes.append(code)
+        self.versions.append(version)
+        self.stale.append(stale)
+        for name, value in zip(FLOAT_COLUMNS, values):
+            self.floats[name].append(math.nan if value is None else value)
+
+    def to_dict(self, meta=None):
+        return {
+            "codes": self.codes,
+            "versions": self.versions,
+            "names": self.names,
+            **{name: [None if math.isnan(v) else v for v in values] for name, values in self.floats.items()},
+            "stale": self.stale,
+            "meta": meta or {},
+        }
+
+
+def _strings(values):
+    encoded = [value.encode() for value in values]
+    return struct.pack(f"<I{len(encoded)}I", len(encoded), *map(len, encoded)) + b"".join(encoded)
+
+
+def encode_columns(columns, meta=None):
+    parts = [MAGIC, struct.pack("<I", len(columns)), _strings(columns.codes), _strings(columns.versions),
+             _strings([s for pair in columns.names.items() for s in pair])]
+    for name in FLOAT_COLUMNS:
+        values = array('d', columns.floats[name])
+        if sys.byteorder == "big":
+            values.byteswap()
+        parts.append(values.tobytes())
+    parts.append(bytes(columns.stale))
+    parts.append(_strings([json.dumps(meta or {}, ensure_ascii=False)]))
+    return b"".join(parts)
+
+
+def decode_columns(data):
+    """解码 application/x-fund-columns，返回 to_dict() 同样结构（用于调试和测试）"""
+    if data[:4] != MAGIC:
+        raise ValueError("不是 fund-columns 数据")
+    (rows,), pos = struct.unpack_from("<I", data, 4), 8
+
+    def strings():
+        nonlocal pos
+        (count,) = struct.unpack_from("<I", data, pos)
+        sizes = struct.unpack_from(f"<{count}I", data, pos + 4)
+        pos += 4 + 4 * count
+        values = []
+        for size in sizes:
+            values.append(data[pos:pos + size].decode())
+            pos += size
+        return values
+
+    columns = Columns()
+    columns.codes, columns.versions = strings(), strings()
+    pairs = strings()
+    columns.names = dict(zip(pairs[::2], pairs[1::2]))
+    for name in FLOAT_COLUMNS:
+        values = array('d', data[pos:pos + 8 * rows])
+        if sys.byteorder == "big":
+            values.byteswap()
+        columns.floats[name] = list(values)
+        pos += 8 * rows
+    columns.stale = [bool(b) for b in data[pos:pos + rows]]
+    pos += rows
+    return columns.to_dict(json.loads(strings()[0]))
+
+
+def negotiate(accept):
+    """按 Accept 选择紧凑格式，客户端未请求时返回 None（使用 JSON）"""
+    accept = accept or ""
+    if COLUMNS_TYPE in accept:
+        return COLUMNS_TYPE
+    if msgpack is not None and MSGPACK_TYPE in accept:
+        return MSGPACK_TYPE
+    return None
+
+
+def encode(media_type, columns, meta=None):
+    if media_type == MSGPACK_TYPE:
+        return msgpack.packb(columns.to_dict(meta), use_bin_type=True)
+    return encode_columns(columns, meta)
+
+
+def _accepted_encodings(accept_encoding):
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        token, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def compress(body, accept_encoding):
+    """返回 (响应体, Content-Encoding 或 None)"""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5, mtime=0), "gzip"
+    return body, None
@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import time
+import math
+import bisect
+from collections import Counter
+
+import http_pool
+
+# 天天基金全量基金列表：[[代码, 拼音缩写, 名称, 类型, 拼音全称], ...]
+FUNDCODE_SEARCH_URL = "https://fund.eastmoney.com/js/fundcode_search.js"
+
+# 模糊匹配的最低得分（0~1），低于该值视为未识别
+FUZZY_MIN_SCORE = 0.5
+# 出现在过多基金中的二元组（如“混合”“联接”）不用于召回，只参与打分
+COMMON_GRAM_DF = 500
+# 参与精确打分的候选条目数
+CANDIDATE_LIMIT = 64
+
+CODE_RE = re.compile(r'\d{6}')
+ABBR_RE = re.compile(r'[A-Z]{3,}')
+
+
+def normalize_name(name):
+    """统一全角括号、空格和大小写，便于匹配"""
+    name = name.replace('（', '(').replace('）', ')').replace(' ', '').replace('　', '')
+    return name.upper()
+
+
+def bigrams(text):
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class FundDirectory:
+    """本地基金目录：代码→名称索引、名称前缀索引及二元组模糊索引"""
+
+    def __init__(self):
+        self.funds = {}      # code -> {"name", "abbr", "type"}
+        self.aliases = {}    # 用户习惯的简称/已学习的名称 -> code
+        self.updated = 0.0
+        self._by_name = {}
+        self._entries = []   # [(code, 规范化名称, 二元组集合)]，下标即条目 id
+        self._postings = {}  # bigram -> [条目 id]
+        self._sorted_names = []
+        self._sorted_abbrs = []
+
+    def __len__(self):
+        return len(self.funds)
+
+    def replace(self, records):
+        """用全量列表替换目录（保留已学习的别名）"""
+        funds = {}
+        for code, abbr, name, *rest in records:
+            funds[code] = {"name": name, "abbr": abbr.upper(), "type": rest[0] if rest else ""}
+        self.funds = funds
+        self.updated = time.time()
+        self._rebuild()
+
+    def add_alias(self, alias, code):
+        """记录一个名称到代码的映射，增量更新索引"""
+        key = normalize_name(alias)
+        if not key or self._by_name.get(key) == code:
+            return
+        self.aliases[alias] = code
+        if code not in self.funds:
+            self.funds[code] = {"name": alias, "abbr": "", "type": ""}
+        self._index(code, key)
+        bisect.insort(self._sorted_names, (key, code))
+
+    def name_of(self, code):
+        fund = self.funds.get(code)
+        return fund["name"] if fund else None
+
+    def _rebuild(self):
+        self._by_name = {}
+        self._entries = []
+        self._postings = {}
+        for alias, code in self.aliases.items():
+            self.funds.setdefault(code, {"name": alias, "abbr": "", "type": ""})
+        for code, fund in self.funds.items():
+            self._index(code, normalize_name(fund["name"]))
+        for alias, code in self.aliases.items():
+            self._index(code, normalize_name(alias))
+        self._sorted_names = sorted((key, code) for key, code in self._by_name.items())
+        self._sorted_abbrs = sorted((f["abbr"], code) for code, f in self.funds.items() if f["abbr"])
+
+    def _index(self, code, key):
+        self._by_name.setdefault(key, code)
+        entry_id = len(self._entries)
+        grams = bigrams(key)
+        self._entries.append((code, key, grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(entry_id)
+
+    def _prefix(self, sorted_list, prefix, max_scan=200):
+        """返回以 prefix 开头的最短一项"""
+        i = bisect.bisect_left(sorted_list, (prefix, ""))
+        best = None
+        for item in sorted_list[i:i + max_scan]:
+            if not item[0].startswith(prefix):
+                break
+            if best is None or len(item[0]) < len(best[0]):
+                best = item
+        return best
+
+    def search(self, keyword, limit=5):
+        """二元组模糊搜索，返回 [(得分, 代码, 名称)]，兼容简称与 OCR 错字"""
+        query = normalize_name(keyword)
+        grams = bigrams(query)
+        if not grams:
+            return []
+        postings = self._postings
+        total = len(self._entries) or 1
+
+        def idf(g):
+            return math.log(1 + total / (1 + len(postings.get(g, ()))))
+
+        weights = {g: idf(g) for g in grams}
+
+        # 先用稀有二元组召回候选，常见二元组只在全部常见时才用于召回
+        recall = [g for g in grams if 0 < len(postings.get(g, ())) < COMMON_GRAM_DF]
+        if not recall:
+            recall = [g for g in grams if g in postings]
+        hits = Counter()
+        for g in recall:
+            hits.update(postings[g])
+        # 只对命中二元组最多的若干条目精确打分
+        candidates = [entry_id for entry_id, _ in hits.most_common(CANDIDATE_LIMIT)]
+
+        query_weight = sum(weights.values())
+        scored = {}
+        for entry_id in candidates:
+            code, key, key_grams = self._entries[entry_id]
+            shared = sum(weights[g] for g in grams & key_grams)
+            key_weight = shared + sum(idf(g) for g in key_grams - grams)
+            score = 2 * shared / (query_weight + key_weight)
+            if score > scored.get(code, (0,))[0]:
+                scored[code] = (score, code, self.funds[code]["name"])
+        return sorted(scored.values(), reverse=True)[:limit]
+
+    def lookup(self, keyword):
+        """本地识别基金名称，返回 (代码, 名称)，识别失败返回 (None, None)"""
+        query = normalize_name(keyword)
+        if not query:
+            return None, None
+        code = self._by_name.get(query)
+        if code:
+            return code, self.funds[code]["name"]
+        if CODE_RE.fullmatch(query) and query in self.funds:
+            return query, self.funds[query]["name"]
+        # 拼音缩写，如 HXCZHH
+        if ABBR_RE.fullmatch(query):
+            hit = self._prefix(self._sorted_abbrs, query)
+            if hit:
+                return hit[1], self.funds[hit[1]]["name"]
+        # 名称前缀，如 “易方达优质企业” -> “易方达优质企业三年持有期混合”
+        if len(query) >= 4:
+            hit = self._prefix(self._sorted_names, query)
+            if hit:
+                return hit[1], self.funds[hit[1]]["name"]
+        results = self.search(query, limit=1)
+        if results and results[0][0] >= FUZZY_MIN_SCORE:
+            return results[0][1], results[0][2]
+        return None, None
+
+    def load(self, path):
+        """从磁盘加载目录文件，不存在时返回 False"""
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.aliases.update(data.get("aliases", {}))
+        self.funds = {code: {"name": name, "abbr": abbr, "type": ftype} for code, name, abbr, ftype in data.get("funds", [])}
+        self.updated = data.get("updated", 0.0)
+        self._rebuild()
+        return True
+
+    def save(self, path):
+        """写入临时文件后原子替换，避免读到写了一半的文件"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {
+            "updated": self.updated,
+            "funds": [[code, f["name"], f["abbr"], f["type"]] for code, f in self.funds.items()],
+            "aliases": self.aliases,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+
+async def fetch_fund_universe():
+    """下载全量基金列表（约 2 万支）"""
+    content = await http_pool.get_text(FUNDCODE_SEARCH_URL, timeout=30, encoding='utf-8-sig')
+    match = re.search(r'=\s*(\[.*\])\s*;?\s*$', content, re.S)
+    if not match:
+        raise ValueError("基金列表格式无法识别")
+    return json.loads(match.group(1))
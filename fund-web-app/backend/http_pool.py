@@ -0,0 +1,436 @@
+"""
+共享的异步 HTTP 客户端
+每个上游域名一个长连接池 (keep-alive)，并限制单域名并发数，
+后端接口和命令行脚本统一通过这里访问行情接口。
+"""
+import os
+import time
+import asyncio
+import contextvars
+import urllib.parse
+
+import httpx
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'
+
+# 单域名最大并发（同时也是连接池大小），可用环境变量 HTTP_HOST_LIMIT 统一覆盖默认值
+DEFAULT_HOST_LIMIT = int(os.environ.get("HTTP_HOST_LIMIT", 8))
+HOST_LIMITS = {
+    "gz-fund.10jqka.com.cn": 16,
+    "fundgz.1234567.com.cn": 16,
+    "fundsuggest.eastmoney.com": 8,
+    "push2.eastmoney.com": 8,
+}
+
+# 连接超时 5 秒，读取超时 10 秒，等待空闲连接最多 10 秒
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0, pool=10.0)
+
+# 单域名请求速率（次/秒）：默认不限速，只在遇到 429 或错误后才从当时的实际速率开始降速，恢复后逐步放开
+# HTTP_HOST_RATE 设为正数时作为固定上限
+DEFAULT_HOST_RATE = float(os.environ.get("HTTP_HOST_RATE", 0)) or None
+MIN_HOST_RATE = 1.0
+# 连续失败达到该次数后熔断，熔断期间直接失败；冷却时间每次探测失败翻倍，最长 BREAKER_MAX_COOLDOWN
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 10))
+BREAKER_MAX_COOLDOWN = 120.0
+
+
+# 请求结束回调 (host, 耗时秒数, 错误类型或 None)，用于指标统计
+observers = []
+
+
+def _notify(host, seconds, error):
+    for observer in observers:
+        observer(host, seconds, error)
+
+
+class RequestTrace:
+    """
+    一次逻辑请求中真正发往上游的时间：拿到限速令牌和并发名额之后才开始计时，不含本地排队
+    调用方在自己的任务里 current_trace.set(trace) 后，该任务内经连接池发出的请求都会记到 trace 上
+    """
+
+    def __init__(self):
+        self.sent = asyncio.Event()
+        self.sent_at = None     # 第一个请求发出的时刻 (perf_counter)
+        self.upstream = 0.0     # 各请求在上游耗时之和（秒）
+        self.requests = 0
+
+    def begin(self, started):
+        if self.sent_at is None:
+            self.sent_at = started
+            self.sent.set()
+        self.requests += 1
+
+    def end(self, seconds):
+        self.upstream += seconds
+
+
+current_trace = contextvars.ContextVar("http_pool_trace", default=None)
+
+
+def _error_kind(exc):
+    if isinstance(exc, httpx.HTTPStatusError):
+        return str(exc.response.status_code)
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.TransportError):
+        return "connect"
+    return type(exc).__name__
+
+
+class CircuitOpenError(Exception):
+    """上游熔断中，请求未发出"""
+
+
+class CircuitBreaker:
+    """
+    单域名熔断器：closed 正常放行；open 期间直接拒绝；
+    冷却结束后进入 half_open，只放行一个探测请求，成功则恢复，失败则加倍冷却
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+
+    def allow(self):
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, ok):
+        if ok:
+            self.state = "closed"
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+        else:
+            self.failures += 1
+            if self.state == "half_open":
+                self.cooldown = min(BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+                self._open()
+            elif self.failures >= self.threshold:
+                self._open()
+        self._probing = False
+
+    def cancel(self):
+        """请求被取消、未得出结果时释放探测名额"""
+        self._probing = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def retry_in(self):
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+
+
+class AdaptiveRateLimiter:
+    """
+    令牌桶限速，速率按 AIMD 调整：429 减半（并遵守 Retry-After），超时/5xx 降为 0.8 倍，
+    同一秒内的多个错误只降速一次，避免并发错误把速率直接压到底
+    rate 为 None 表示不限速；首次降速以最近一秒实际完成的请求数为基准，
+    之后每个成功请求加回基准的 5%，回升到基准的两倍（或 max_rate）后解除限速
+    """
+
+    def __init__(self, max_rate, burst):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self.ceiling = max_rate
+        # 按秒统计实际完成的请求数，作为降速基准
+        self.window = int(self.updated)
+        self.window_count = 0
+        self.observed = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.rate is None:
+                return
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def _count(self):
+        second = int(time.monotonic())
+        if second != self.window:
+            self.observed = self.window_count if second == self.window + 1 else 0
+            self.window, self.window_count = second, 0
+        self.window_count += 1
+
+    def on_success(self):
+        self._count()
+        if self.rate is None or self.ceiling is None:
+            return
+        self.rate = min(self.ceiling, self.rate + self.ceiling * 0.025)
+        if self.rate >= self.ceiling and self.max_rate is None:
+            self.rate = self.ceiling = None
+
+    def _decrease(self, factor):
+        self._count()
+        now = time.monotonic()
+        if now - self.last_decrease < 1.0:
+            return
+        self.last_decrease = now
+        if self.rate is None:
+            base = max(MIN_HOST_RATE, self.observed, self.window_count)
+            self.rate = base
+            self.ceiling = base * 2
+            self.tokens = 0.0
+            self.updated = now
+        self.rate = max(MIN_HOST_RATE, self.rate * factor)
+
+    def on_error(self):
+        self._decrease(0.8)
+
+    def on_throttled(self, retry_after=None):
+        self.throttled += 1
+        self._decrease(0.5)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+def _retry_after(response):
+    try:
+        return min(60.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return None
+
+
+def _is_upstream_failure(exc):
+    """超时、连接错误、429 和 5xx 计入熔断；其他 4xx 属于请求本身的问题"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def _parse_overrides(value):
+    """
+    上游地址重定向，用于压测时指向本地模拟服务器
+    格式: "gz-fund.10jqka.com.cn=http://127.0.0.1:9100,*=http://127.0.0.1:9100"，* 匹配所有域名
+    """
+    overrides = {}
+    for item in value.split(","):
+        host, sep, base = item.strip().partition("=")
+        if sep:
+            overrides[host.strip()] = base.strip().rstrip("/")
+    return overrides
+
+
+UPSTREAM_OVERRIDE = _parse_overrides(os.environ.get("UPSTREAM_OVERRIDE", ""))
+
+
+def _rewrite(url):
+    if not UPSTREAM_OVERRIDE:
+        return url
+    parts = urllib.parse.urlsplit(url)
+    base = UPSTREAM_OVERRIDE.get(parts.hostname) or UPSTREAM_OVERRIDE.get("*")
+    if not base:
+        return url
+    target = urllib.parse.urlsplit(base)
+    return urllib.parse.urlunsplit((target.scheme, target.netloc, parts.path, parts.query, parts.fragment))
+
+
+class HostPool:
+    """单个上游域名的连接池及并发控制"""
+
+    def __init__(self, host, limit):
+        self.host = host
+        self.limit = limit
+        self.loop = asyncio.get_running_loop()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit, keepalive_expiry=60),
+            timeout=DEFAULT_TIMEOUT,
+            headers={'User-Agent': DEFAULT_USER_AGENT},
+        )
+        # 长连接推送单独建客户端（按需创建），不占用上面连接池的名额
+        self.stream_client = None
+        self.semaphore = asyncio.Semaphore(limit)
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveRateLimiter(DEFAULT_HOST_RATE, burst=limit)
+        self.active = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.streams = 0
+
+    def _reject(self):
+        self.rejected += 1
+        _notify(self.host, 0.0, "circuit_open")
+        raise CircuitOpenError(f"{self.host} 熔断中，{self.breaker.retry_in():.0f} 秒后重试")
+
+    async def get(self, url, headers=None, timeout=None):
+        if not self.breaker.allow():
+            self._reject()
+        self.waiting += 1
+        try:
+            await self.limiter.acquire()
+            await self.semaphore.acquire()
+        except asyncio.CancelledError:
+            self.breaker.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+        # 排队期间可能已经熔断，排队的请求同样直接失败
+        if self.breaker.state == "open":
+            self.semaphore.release()
+            self._reject()
+        self.active += 1
+        self.requests += 1
+        started = time.perf_counter()
+        trace = current_trace.get()
+        if trace is not None:
+            trace.begin(started)
+        try:
+            kwargs = {"headers": headers}
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            response = await self.client.get(url, **kwargs)
+            response.raise_for_status()
+        except asyncio.CancelledError:
+            self.breaker.cancel()
+            raise
+        except Exception as e:
+            self._record_error(e, started)
+            raise
+        finally:
+            self.active -= 1
+            self.semaphore.release()
+            if trace is not None:
+                trace.end(time.perf_counter() - started)
+        _notify(self.host, time.perf_counter() - started, None)
+        self.breaker.record(True)
+        self.limiter.on_success()
+        return response
+
+    def _record_error(self, e, started):
+        self.errors += 1
+        _notify(self.host, time.perf_counter() - started, _error_kind(e))
+        if _is_upstream_failure(e):
+            self.breaker.record(False)
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                self.limiter.on_throttled(_retry_after(e.response))
+            else:
+                self.limiter.on_error()
+        else:
+            self.breaker.record(True)
+
+    async def stream(self, url, headers=None, read_timeout=60.0):
+        """
+        长连接流式 GET，逐行产出；read_timeout 秒内没有收到任何数据视为断线
+        每条推送连接会一直占着，走单独的不限连接数的客户端，也不经过熔断和限速：
+        否则推送连接数达到连接池上限后，普通请求和多出来的推送连接都会排队超时并把整个域名熔断。
+        断线重连的节奏由调用方的退避控制
+        """
+        if self.stream_client is None:
+            self.stream_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=0),
+                headers={'User-Agent': DEFAULT_USER_AGENT},
+            )
+        self.requests += 1
+        self.streams += 1
+        started = time.perf_counter()
+        try:
+            timeout = httpx.Timeout(read_timeout, connect=DEFAULT_TIMEOUT.connect)
+            async with self.stream_client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                response.raise_for_status()
+                _notify(self.host, time.perf_counter() - started, None)
+                async for line in response.aiter_lines():
+                    yield line
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            _notify(self.host, time.perf_counter() - started, _error_kind(e))
+            raise
+        finally:
+            self.streams -= 1
+
+
+_pools = {}
+
+
+def _get_pool(url):
+    host = urllib.parse.urlsplit(url).hostname
+    pool = _pools.get(host)
+    # 连接绑定在事件循环上，命令行脚本多次 asyncio.run 时需要重建
+    if pool is None or pool.loop is not asyncio.get_running_loop():
+        pool = HostPool(host, HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+        _pools[host] = pool
+    return pool
+
+
+async def get_text(url, headers=None, timeout=None, encoding='utf-8'):
+    """GET 请求并返回文本，HTTP 错误和超时以异常抛出"""
+    pool = _get_pool(url)
+    response = await pool.get(_rewrite(url), headers=headers, timeout=timeout)
+    return response.content.decode(encoding)
+
+
+async def get_json(url, headers=None, timeout=None):
+    """GET 请求并解析 JSON"""
+    pool = _get_pool(url)
+    response = await pool.get(_rewrite(url), headers=headers, timeout=timeout)
+    return response.json()
+
+
+async def stream_lines(url, headers=None, read_timeout=60.0):
+    """流式 GET（如 SSE 推送），逐行产出文本，断线以异常抛出"""
+    pool = _get_pool(url)
+    async for line in pool.stream(_rewrite(url), headers=headers, read_timeout=read_timeout):
+        yield line
+
+
+def pool_stats():
+    """各域名连接池的并发与请求统计"""
+    return {
+        host: {
+            "limit": p.limit,
+            "active": p.active,
+            "waiting": p.waiting,
+            "requests": p.requests,
+            "errors": p.errors,
+            "circuit": p.breaker.state,
+            "circuitTrips": p.breaker.trips,
+            "rejected": p.rejected,
+            "streams": p.streams,
+            "rate": None if p.limiter.rate is None else round(p.limiter.rate, 2),
+            "throttled": p.limiter.throttled,
+        }
+        for host, p in _pools.items()
+    }
+
+
+async def aclose():
+    """关闭所有连接池（应用退出或脚本结束时调用）"""
+    pools = list(_pools.values())
+    _pools.clear()
+    for p in pools:
+        await p.client.aclose()
+        if p.stream_client is not None:
+            await p.stream_client.aclose()
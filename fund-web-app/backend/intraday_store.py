@@ -0,0 +1,93 @@
+import re
+import time
+from array import array
+
+# 同花顺分时数据点：HHMM,估值,昨日净值,涨跌幅，多个点之间以 ; 分隔
+POINT_RE = re.compile(r'(?:^|;)\s*(\d{4}),(\d+(?:\.\d+)?)')
+
+SESSION_START = "0930"
+
+
+def parse_ths_chart(content):
+    """
+    解析同花顺分时接口
+    格式: vm_fd_163406='...|2026-01-30~2.2511~0930,0930,2.2511,...;1500,2.28318,2.2511,0.000'
+    返回 (日期, 昨日净值, [(HHMM, 估值), ...])，无法解析时返回 None
+    """
+    if '|' not in content or '~' not in content:
+        return None
+    main_part = content.split('|', 1)[1].strip().rstrip(";'\" \n")
+    header, _, body = main_part.partition(',')
+    parts = header.split('~')
+    if len(parts) < 2:
+        return None
+    points = [(int(t), float(v)) for t, v in POINT_RE.findall(body)]
+    return parts[0], float(parts[1]), points
+
+
+class IntradayCurve:
+    """单支基金当日分时估值曲线，使用紧凑数组存储"""
+    __slots__ = ("date", "prev_jz", "times", "values", "fetched")
+
+    def __init__(self, date, prev_jz):
+        self.date = date
+        self.prev_jz = prev_jz
+        self.fetched = 0.0        # 最近一次合并抓取结果的时间戳
+        self.times = array('H')   # HHMM 整数
+        self.values = array('d')
+
+    def extend(self, points):
+        """追加新数据点，已有时间点之前（含）的数据直接忽略，返回新增点数"""
+        last = self.times[-1] if self.times else -1
+        added = 0
+        for t, v in points:
+            if t > last:
+                self.times.append(t)
+                self.values.append(v)
+                last = t
+                added += 1
+        return added
+
+    def last(self):
+        if not self.times:
+            return None
+        return self.times[-1], self.values[-1]
+
+    def to_dict(self):
+        return {
+            "date": self.date,
+            "prevJZ": self.prev_jz,
+            "times": [f"{t:04d}" for t in self.times],
+            "values": list(self.values),
+        }
+
+
+class IntradayStore:
+    """按基金代码保存当日分时曲线，支持只抓取上次之后的增量数据"""
+
+    def __init__(self):
+        self.curves = {}
+
+    def get(self, code):
+        return self.curves.get(code)
+
+    def next_start(self, code):
+        """下一次请求的 start 参数：从已有的最后一个时间点开始（含该点，去重在 extend 中完成）"""
+        curve = self.curves.get(code)
+        if curve is None or not curve.times:
+            return SESSION_START
+        return f"{curve.times[-1]:04d}"
+
+    def update(self, code, date, prev_jz, points, full):
+        """
+        合并一次抓取结果
+        full: 本次是否从开盘起的完整曲线；增量结果的日期与已有曲线不同时返回 None，需重新完整抓取
+        """
+        curve = self.curves.get(code)
+        if curve is None or curve.date != date or curve.prev_jz != prev_jz:
+            if not full:
+                return None
+            curve = self.curves[code] = IntradayCurve(date, prev_jz)
+        curve.extend(points)
+        curve.fetched = time.time()
+        return curve
@@ -0,0 +1,47 @@
+import os
+
+try:
+    import fcntl
+except ImportError:   # Windows 没有 flock，按单进程运行处理
+    fcntl = None
+
+
+class LeaderLock:
+    """
+    多 worker 主节点选举：拿到锁文件排他锁 (flock) 的进程为主节点，负责后台抓取
+    主节点进程退出（包括崩溃）时锁由系统释放，其他 worker 下次尝试时接任
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def is_leader(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            self._file = True
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None and self._file is not True:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+        self._file = None
@@ -1,18 +1,56 @@
 import os
 import re
 import json
-import urllib.request
 import urllib.parse
+import hashlib
+import time
 import datetime
 import uvicorn
 import asyncio
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from pydantic import BaseModel
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from concurrent.futures import ThreadPoolExecutor
+import http_pool
+from quote_cache import QuoteCache
+from fund_directory import FundDirectory, fetch_fund_universe
+from name_matcher import NameMatcher
+from intraday_store import IntradayStore, parse_ths_chart, SESSION_START
+from poller import QuotePoller
+from snapshot_store import SnapshotStore
+from leader_lock import LeaderLock
+from portfolio_registry import PortfolioRegistry
+from source_router import SourceRouter
+from universe_snapshot import UniverseSnapshot, build_snapshot
+import market_hours
+import metrics
+import compact_codec
+from metrics import phase
+
+@asynccontextmanager
+async def lifespan(app):
+    fund_directory.load(FUND_DIRECTORY_PATH)
+    index_directory_names()
+    restore_snapshot()
+    background = [
+        asyncio.create_task(leader_loop()),
+        asyncio.create_task(snapshot_flush_loop()),
+        asyncio.create_task(portfolio_expire_loop()),
+    ]
+    if UNIVERSE_ENABLED:
+        background.append(asyncio.create_task(universe_build_loop()))
+    if SHARED_CACHE:
+        background.append(asyncio.create_task(shared_sync_loop()))
+    yield
+    for task in background:
+        task.cancel()
+    snapshot_store.close()
+    # 退出时关闭上游长连接
+    await http_pool.aclose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 允许跨域
 app.add_middleware(
@@ -20,6 +58,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # 基金名称到代码的缓存
@@ -55,8 +94,57 @@ FUND_CACHE = {
     "摩根标普500指数(QDII)A": "017641"
 }
 
-def search_fund_by_name(keyword):
-    """从天天基金公开接口搜索基金代码"""
+# 本地全量基金目录，默认每 24 小时整体刷新一次
+FUND_DIRECTORY_PATH = os.environ.get("FUND_DIRECTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fund_directory.json"))
+FUND_DIRECTORY_REFRESH = float(os.environ.get("FUND_DIRECTORY_REFRESH_HOURS", 24)) * 3600
+fund_directory = FundDirectory()
+# 已知名称自动机，用于在整行文本中匹配名称：学到的名称（含简称）及基金目录中的全称
+known_names = NameMatcher()
+for _name, _code in FUND_CACHE.items():
+    fund_directory.add_alias(_name, _code)
+    known_names.add(_name, _code)
+
+def index_directory_names():
+    """基金目录加载或更新后，把其中的全称批量加入名称自动机"""
+    known_names.add_many((fund["name"], code) for code, fund in list(fund_directory.funds.items()) if fund["name"])
+
+# 文本解析用到的正则
+CODE_RE = re.compile(r'\b\d{6}\b')
+# 匹配模式：[序号.] 基金名称 [:：\s] 金额
+NAME_LINE_RE = re.compile(r'^\s*(?:\d+[\.、\s]+)?(.*?)\s*[:：\s]\s*(\d.*)$')
+AMOUNT_RE = re.compile(r'[+-]?\d[\d,]*\.?\d+')
+
+def learn_name(name, code):
+    """记录新学到的名称映射"""
+    FUND_CACHE[name] = code
+    fund_directory.add_alias(name, code)
+    known_names.add(name, code)
+
+def fund_name(fund_code):
+    """按代码获取基金名称"""
+    return fund_directory.name_of(fund_code) or f"基金({fund_code})"
+
+async def refresh_fund_directory():
+    """整体下载基金列表并写入本地目录"""
+    try:
+        records = await fetch_fund_universe()
+        fund_directory.replace(records)
+        index_directory_names()
+        await asyncio.to_thread(fund_directory.save, FUND_DIRECTORY_PATH)
+        print(f"基金目录已更新: {len(fund_directory)} 支")
+    except Exception as e:
+        print(f"更新基金目录失败: {e}")
+
+async def directory_refresh_loop():
+    while True:
+        if time.time() - fund_directory.updated >= FUND_DIRECTORY_REFRESH:
+            await refresh_fund_directory()
+        wait = FUND_DIRECTORY_REFRESH - (time.time() - fund_directory.updated)
+        # 下载失败时 10 分钟后重试
+        await asyncio.sleep(wait if wait > 0 else 600)
+
+async def search_fund_by_name(keyword):
+    """识别基金名称：优先查本地目录，目录未加载时才调用天天基金公开接口搜索"""
     if keyword in FUND_CACHE:
         return FUND_CACHE[keyword], keyword
     
@@ -64,61 +152,131 @@ def search_fund_by_name(keyword):
     keyword = keyword.strip().replace(' ', '')
     if len(keyword) < 2: return None, None
     
+    code, name = fund_directory.lookup(keyword)
+    if code or fund_directory.updated:
+        return code, name
+    
     url = f"https://fundsuggest.eastmoney.com/FundSearch/api/FundSearchAPI.ashx?m=1&key={urllib.parse.quote(keyword)}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'
-    }
     try:
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as response:
-            res_data = json.loads(response.read().decode('utf-8'))
-            if res_data.get('Datas') and len(res_data['Datas']) > 0:
-                # 匹配最接近的一个
-                best_match = res_data['Datas'][0]
-                code = best_match.get('CODE')
-                name = best_match.get('NAME')
-                if code:
-                    FUND_CACHE[keyword] = code
-                    return code, name
+        res_data = json.loads(await http_pool.get_text(url, timeout=5))
+        if res_data.get('Datas') and len(res_data['Datas']) > 0:
+            # 匹配最接近的一个
+            best_match = res_data['Datas'][0]
+            code = best_match.get('CODE')
+            name = best_match.get('NAME')
+            if code:
+                learn_name(keyword, code)
+                snapshot_store.save_name(keyword, code)
+                return code, name
     except Exception as e:
         print(f"搜索基金失败 {keyword}: {e}")
     return None, None
 
-def get_fund_info_ths(fund_code):
-    """从同花顺获取基金实时估值"""
-    url = f"https://gz-fund.10jqka.com.cn/?module=api&controller=index&action=chart&info=vm_fd_{fund_code}&start=0930"
+# 当日分时曲线，后续轮询只请求已有最后时间点之后的数据
+intraday_store = IntradayStore()
+
+async def fetch_ths_chart(fund_code, start):
+    url = f"https://gz-fund.10jqka.com.cn/?module=api&controller=index&action=chart&info=vm_fd_{fund_code}&start={start}"
     headers = {
-        'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1',
         'Referer': 'https://fund.10jqka.com.cn/'
     }
+    return parse_ths_chart(await http_pool.get_text(url, headers=headers, timeout=10))
+
+async def fetch_intraday(fund_code):
+    """增量抓取同花顺分时曲线并合并，返回 IntradayCurve，取不到时返回 None"""
+    start = intraday_store.next_start(fund_code)
+    parsed = await fetch_ths_chart(fund_code, start)
+    if not parsed:
+        return None
+    curve = intraday_store.update(fund_code, *parsed, full=start == SESSION_START)
+    if curve is None:
+        # 已跨交易日，重新抓取完整曲线
+        parsed = await fetch_ths_chart(fund_code, SESSION_START)
+        if not parsed:
+            return None
+        curve = intraday_store.update(fund_code, *parsed, full=True)
+    return curve
+
+def intraday_fresh(curve):
+    """分时曲线与行情缓存有效期相同：TTL 内抓取的，或最近一次收盘后抓取的"""
+    if time.time() - curve.fetched < QUOTE_CACHE_TTL:
+        return True
+    final_after = final_quote_after()
+    return final_after is not None and curve.fetched >= final_after
+
+async def get_fund_info_ths(fund_code):
+    """从同花顺获取基金实时估值（增量抓取分时曲线）"""
     try:
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=10) as response:
-            content = response.read().decode('utf-8')
-            if '|' in content and '~' in content:
-                main_part = content.split('|')[1]
-                header = main_part.split(',')[0]
-                parts = header.split('~')
-                
-                data_points = content.split(',')
-                last_point = data_points[-1].strip("'").split(';')[-1]
-                last_val = last_point.split(',')[1] if ',' in last_point else parts[1]
-                
-                prev_jz = float(parts[1])
-                curr_gsz = float(last_val)
-                gszzl = ((curr_gsz - prev_jz) / prev_jz) * 100
-                
-                return {
-                    'code': fund_code,
-                    'prevJZ': prev_jz,
-                    'currGSZ': curr_gsz,
-                    'gszzl': gszzl,
-                    'gztime': parts[0] + " " + (last_point.split(',')[0] if ',' in last_point else "实时")
-                }
+        curve = await fetch_intraday(fund_code)
+        if curve is None:
+            return None
+
+        prev_jz = curve.prev_jz
+        last = curve.last()
+        curr_gsz = last[1] if last else prev_jz
+        gszzl = ((curr_gsz - prev_jz) / prev_jz) * 100
+        
+        return {
+            'code': fund_code,
+            'prevJZ': prev_jz,
+            'currGSZ': curr_gsz,
+            'gszzl': gszzl,
+            'gztime': curve.date + " " + (f"{last[0]:04d}" if last else "实时")
+        }
+    except http_pool.CircuitOpenError:
+        # 熔断中直接放弃，由调用方改用其他数据源或缓存
+        pass
     except Exception as e:
         print(f"Error fetching THS data for {fund_code}: {e}")
     return None
 
+FUNDGZ_RE = re.compile(r'jsonpgz\((.*)\);?')
+
+async def get_fund_info_fundgz(fund_code):
+    """从天天基金获取基金实时估值，返回格式与 get_fund_info_ths 一致"""
+    url = f"https://fundgz.1234567.com.cn/js/{fund_code}.js"
+    try:
+        content = await http_pool.get_text(url, timeout=10)
+    except http_pool.CircuitOpenError:
+        return None
+    match = FUNDGZ_RE.search(content)
+    if not match or not match.group(1):
+        return None
+    info = json.loads(match.group(1))
+    prev_jz = float(info['dwjz'])
+    curr_gsz = float(info['gsz'])
+    return {
+        'code': fund_code,
+        'prevJZ': prev_jz,
+        'currGSZ': curr_gsz,
+        'gszzl': ((curr_gsz - prev_jz) / prev_jz) * 100,
+        'gztime': info.get('gztime', '')
+    }
+
+def stale_quote(data):
+    """
+    可疑估值（规则见 market_hours.estimate_is_stale）：开盘后估值时间仍不是当天，或当天没有任何分时点的 0.00%
+    可疑数据只在其他数据源都拿不到时才使用
+    """
+    return market_hours.estimate_is_stale(data['gszzl'], data['gztime'])
+
+QUOTE_SOURCES = {
+    "ths": get_fund_info_ths,
+    "fundgz": get_fund_info_fundgz,
+}
+
+def build_source_router():
+    """QUOTE_SOURCES 环境变量指定启用的数据源及默认优先级，如 ths,fundgz"""
+    names = [n.strip() for n in os.environ.get("QUOTE_SOURCES", "ths,fundgz").split(",") if n.strip() in QUOTE_SOURCES]
+    return SourceRouter(
+        {n: QUOTE_SOURCES[n] for n in names or ["ths"]},
+        is_suspect=stale_quote,
+        hedge_default=float(os.environ.get("HEDGE_DEFAULT_SECONDS", 1.0)),
+    )
+
+# 多数据源对冲：主数据源超过其 p95 未返回时再请求备用源
+source_router = build_source_router()
+
 from typing import List
 
 from pydantic import BaseModel
@@ -126,140 +284,856 @@ from pydantic import BaseModel
 class ResolveRequest(BaseModel):
     text: str
 
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+def final_quote_after():
+    """非交易时段返回最近一次收盘的时间戳，此后抓取的估值在下次开盘前一直有效"""
+    closed_at = market_hours.last_close()
+    return closed_at.timestamp() if closed_at else None
+
+# 行情缓存，TTL 默认 60 秒，与同花顺约一分钟的估值更新频率一致
+QUOTE_CACHE_TTL = float(os.environ.get("QUOTE_CACHE_TTL", 60))
+quote_cache = QuoteCache(ttl=QUOTE_CACHE_TTL, final_after=final_quote_after)
+
+# 多 worker：WEB_CONCURRENCY > 1 时以多进程启动，各 worker 通过快照库共享行情、名称、组合和轮询订阅
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+SHARED_CACHE = WORKERS > 1 or os.environ.get("SHARED_CACHE") == "1"
+# 共享模式下各 worker 每 SHARED_SYNC_INTERVAL 秒读取其他 worker 写入的数据
+SHARED_SYNC_INTERVAL = float(os.environ.get("SHARED_SYNC_INTERVAL", 1))
+
+# 本地快照：最新估值（含昨日净值）和已学习的名称，重启后直接加载
+SNAPSHOT_DB = os.environ.get("SNAPSHOT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshot.db"))
+SNAPSHOT_FLUSH_INTERVAL = float(os.environ.get("SNAPSHOT_FLUSH_INTERVAL", SHARED_SYNC_INTERVAL if SHARED_CACHE else 5))
+snapshot_store = SnapshotStore(SNAPSHOT_DB)
+
+# 主节点选举：持有锁文件的 worker 负责目录刷新和后台轮询，其余 worker 只处理请求
+leader_lock = LeaderLock(os.path.join(os.path.dirname(os.path.abspath(SNAPSHOT_DB)), "leader.lock"))
+LEADER_RETRY_INTERVAL = float(os.environ.get("LEADER_RETRY_INTERVAL", 5))
+
+def is_leader():
+    return not SHARED_CACHE or leader_lock.is_leader
+
+async def leader_loop():
+    """共享模式下等待成为主节点（原主节点退出后由其他 worker 接任），随后启动后台抓取任务"""
+    tasks = []
+    try:
+        while SHARED_CACHE and not leader_lock.try_acquire():
+            await asyncio.sleep(LEADER_RETRY_INTERVAL)
+        if SHARED_CACHE:
+            print(f"worker {os.getpid()} 成为主节点")
+        tasks.append(asyncio.create_task(directory_refresh_loop()))
+        if POLLER_ENABLED:
+            tasks.append(asyncio.create_task(poller.run()))
+        if UNIVERSE_ENABLED:
+            tasks.append(asyncio.create_task(universe_fetch_loop()))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        leader_lock.release()
+
+def restore_snapshot():
+    """启动时从磁盘恢复名称映射和最新估值"""
+    names = snapshot_store.load_names()
+    for name, code in names:
+        learn_name(name, code)
+    quotes = snapshot_store.load_quotes()
+    for code, data, fetched_at in quotes:
+        quote_cache.put(code, data, fetched_at)
+    portfolios = snapshot_store.load_portfolios()
+    for portfolio_id, holdings, updated in portfolios:
+        portfolio_registry.put(portfolio_id, holdings, updated)
+    print(f"已从快照恢复: {len(quotes)} 条估值, {len(names)} 个名称, {len(portfolios)} 个组合")
+
+# 服务端组合：客户端登记一次持仓，之后凭 ID 刷新，行情按所有组合去重后的代码抓取
+portfolio_registry = PortfolioRegistry(idle_ttl=float(os.environ.get("PORTFOLIO_IDLE_DAYS", 30)) * 86400)
+
+async def portfolio_expire_loop():
+    while True:
+        await asyncio.sleep(3600)
+        expired = portfolio_registry.expire()
+        if not SHARED_CACHE:
+            for portfolio_id in expired:
+                snapshot_store.delete_portfolio(portfolio_id)
+            continue
+        # 共享模式下单个 worker 看到的访问不完整，由主节点按库中汇总的访问时间清理
+        if is_leader():
+            now = time.time()
+            for portfolio_id in await asyncio.to_thread(snapshot_store.expire_portfolios, now - portfolio_registry.idle_ttl):
+                portfolio_registry.delete(portfolio_id)
+            # 其他 worker 删除的组合
+            stored = await asyncio.to_thread(snapshot_store.portfolio_ids)
+            for portfolio_id in set(portfolio_registry.portfolios) - stored:
+                portfolio_registry.delete(portfolio_id)
+            await asyncio.to_thread(snapshot_store.prune_subscriptions, now - poller.subscription_ttl)
+
+async def snapshot_flush_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(snapshot_store.flush)
+        except Exception as e:
+            print(f"写入快照失败: {e}")
+
+shared_stats = {"syncs": 0, "quotes": 0, "names": 0, "subscriptions": 0, "portfolios": 0, "readThrough": 0,
+                "directoryReloads": 0}
+
+async def shared_sync_loop():
+    """
+    共享模式下定期读取其他 worker 写入快照库的估值和名称；主节点另外合并各 worker 的轮询订阅和登记的组合，
+    其余 worker 在目录文件被主节点更新后重新加载
+    """
+    # 其他 worker 的数据最多缓冲一个落盘周期才写入，回看窗口留出余量
+    margin = SNAPSHOT_FLUSH_INTERVAL + 2 * SHARED_SYNC_INTERVAL
+    since = time.time() - margin
+    directory_mtime = os.path.getmtime(FUND_DIRECTORY_PATH) if os.path.exists(FUND_DIRECTORY_PATH) else 0
+    while True:
+        await asyncio.sleep(SHARED_SYNC_INTERVAL)
+        now = time.time()
+        try:
+            quotes = await asyncio.to_thread(snapshot_store.quotes_since, since)
+            names = await asyncio.to_thread(snapshot_store.names_since, since)
+            subscriptions = await asyncio.to_thread(snapshot_store.subscriptions_since, since) if is_leader() else []
+            portfolios = await asyncio.to_thread(snapshot_store.portfolios_since, since) if is_leader() else []
+        except Exception as e:
+            print(f"读取共享快照失败: {e}")
+            continue
+        since = now - margin
+        shared_stats["syncs"] += 1
+        for code, data, fetched_at in quotes:
+            if quote_cache.merge(code, data, fetched_at):
+                shared_stats["quotes"] += 1
+        for name, code in names:
+            if FUND_CACHE.get(name) != code:
+                learn_name(name, code)
+                shared_stats["names"] += 1
+        # 订阅时间为墙钟时间，换算为轮询器使用的单调时钟
+        offset = time.monotonic() - now
+        for code, touched_at in subscriptions:
+            if poller.subscriptions.get(code, float("-inf")) < touched_at + offset:
+                poller.subscriptions[code] = touched_at + offset
+                shared_stats["subscriptions"] += 1
+        for portfolio_id, holdings, updated in portfolios:
+            entry = portfolio_registry.portfolios.get(portfolio_id)
+            if entry is None or entry['updated'] < updated:
+                portfolio_registry.put(portfolio_id, holdings, updated)
+                shared_stats["portfolios"] += 1
+        if not is_leader() and os.path.exists(FUND_DIRECTORY_PATH):
+            mtime = os.path.getmtime(FUND_DIRECTORY_PATH)
+            if mtime != directory_mtime:
+                directory_mtime = mtime
+                fund_directory.load(FUND_DIRECTORY_PATH)
+                index_directory_names()
+                shared_stats["directoryReloads"] += 1
+
+async def read_shared_quote(fund_code):
+    """本地缓存未命中时先查快照库，其他 worker 刚抓取的估值直接复用"""
+    row = await asyncio.to_thread(snapshot_store.get_quote, fund_code)
+    if row and quote_cache.merge(fund_code, *row):
+        shared_stats["readThrough"] += 1
+
+def subscribe(codes):
+    """登记客户端持有的基金；共享模式下写入快照库，由主节点的轮询器合并"""
+    codes = list(codes)
+    poller.touch(codes)
+    if SHARED_CACHE:
+        snapshot_store.save_subscriptions(codes)
+
+async def fetch_quote(fund_code):
+    """抓取估值（多数据源对冲）并写入快照"""
+    source, data = await source_router.fetch(fund_code)
+    if data:
+        data = {**data, 'source': source, 'fetchedAt': time.time()}
+        snapshot_store.save_quote(fund_code, data)
+    return data
+
+async def get_quote(fund_code):
+    """
+    经缓存获取单支基金实时估值，同一代码的并发请求只抓取一次
+    上游失败或熔断时立即返回最近一次缓存的估值，并标记 stale
+    """
+    with phase("fetch"):
+        if SHARED_CACHE and quote_cache.peek(fund_code) is None:
+            await read_shared_quote(fund_code)
+        data = await quote_cache.get(fund_code, lambda: fetch_quote(fund_code))
+    if data is None:
+        entry = quote_cache.last(fund_code)
+        if entry:
+            return {**entry[1], 'stale': True}
+    return data
+
+# 刷新接口默认时限（毫秒），0 表示等待全部基金抓取完成
+REFRESH_DEADLINE_MS = int(os.environ.get("REFRESH_DEADLINE_MS", 0))
+
+# 超过时限仍在抓取的请求转入后台继续，完成后写入缓存，下一次请求即为最新值
+revalidating = set()
+
+async def get_quotes_within(codes, deadline=None):
+    """
+    并发获取多支基金行情，deadline 为时限（秒，None 表示等全部完成）
+    超时未返回的基金先用缓存旧值（标记 stale），没有旧值时为 None
+    """
+    tasks = {code: asyncio.ensure_future(get_quote(code)) for code in dict.fromkeys(codes)}
+    if not tasks:
+        return {}
+    await asyncio.wait(tasks.values(), timeout=deadline)
+    quotes = {}
+    for code, task in tasks.items():
+        if task.done():
+            quotes[code] = None if task.cancelled() or task.exception() else task.result()
+            continue
+        revalidating.add(task)
+        task.add_done_callback(revalidating.discard)
+        entry = quote_cache.last(code)
+        quotes[code] = {**entry[1], 'stale': True} if entry else None
+    return quotes
+
+def deadline_seconds(deadline_ms):
+    """请求未指定 deadline_ms 时使用 REFRESH_DEADLINE_MS（默认 0，即不限时）"""
+    if deadline_ms is None:
+        deadline_ms = REFRESH_DEADLINE_MS
+    return deadline_ms / 1000 if deadline_ms > 0 else None
+
+# 后台轮询：交易时段内每 POLL_INTERVAL 秒刷新一遍客户端持有的基金，每秒最多 POLL_RATE 次请求
+POLLER_ENABLED = os.environ.get("POLLER_ENABLED", "1") == "1"
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", 60))
+POLL_RATE = float(os.environ.get("POLL_RATE", 30))
+# 服务端登记的组合持仓常驻轮询，不依赖客户端最近是否请求过
+poller = QuotePoller(
+    lambda code: quote_cache.refresh(code, lambda: fetch_quote(code)),
+    interval=POLL_INTERVAL,
+    rate=POLL_RATE,
+    pinned=lambda: portfolio_registry.codes(),
+)
+
+# 全市场估值快照：交易时段内由主节点按 UNIVERSE_RATE 限速逐支抓取目录中的全部基金（缓存未过期的跳过），
+# 各 worker 定期从行情缓存重建列式快照及排序索引，排行接口直接读索引
+# 全市场抓取与用户刷新共用同一上游的并发名额和限速，默认关闭，需要排行接口时用 UNIVERSE_ENABLED=1 开启
+UNIVERSE_ENABLED = os.environ.get("UNIVERSE_ENABLED", "0") == "1"
+UNIVERSE_INTERVAL = float(os.environ.get("UNIVERSE_INTERVAL", 60))
+UNIVERSE_RATE = float(os.environ.get("UNIVERSE_RATE", 40))
+UNIVERSE_BUILD_INTERVAL = float(os.environ.get("UNIVERSE_BUILD_INTERVAL", 10))
+# 货币型、理财型没有盘中估值，不参与抓取
+UNIVERSE_EXCLUDE_TYPES = tuple(t for t in os.environ.get("UNIVERSE_EXCLUDE_TYPES", "货币型,理财型").split(",") if t)
+UNIVERSE_MAX_N = 500
+universe_poller = QuotePoller(
+    lambda code: quote_cache.get(code, lambda: fetch_quote(code)),
+    interval=UNIVERSE_INTERVAL,
+    rate=UNIVERSE_RATE,
+)
+universe = UniverseSnapshot()
+
+def universe_funds():
+    """参与全市场快照的基金 [(代码, 名称, 类型)]"""
+    return [(code, f["name"], f["type"]) for code, f in list(fund_directory.funds.items())
+            if not f["type"].startswith(UNIVERSE_EXCLUDE_TYPES)]
+
+async def universe_fetch_loop():
+    """交易时段内每 UNIVERSE_INTERVAL 秒抓取一遍全市场估值；基金数超过 UNIVERSE_RATE × 周期时一轮会相应拉长"""
+    loop = asyncio.get_running_loop()
+    while True:
+        wait = market_hours.seconds_until_session()
+        if wait > 0:
+            await asyncio.sleep(min(wait, 600))
+            continue
+        started = loop.time()
+        await universe_poller.poll_cycle([code for code, _, _ in universe_funds()])
+        await asyncio.sleep(max(0.0, UNIVERSE_INTERVAL - (loop.time() - started)))
+
+async def universe_build_loop():
+    """从行情缓存重建快照（只读缓存，不触发抓取），非交易时段估值不再变化，降低重建频率"""
+    global universe
+    while True:
+        funds = universe_funds()
+        try:
+            universe = await asyncio.to_thread(build_snapshot, funds, lambda code: (quote_cache.last(code) or (0, None))[1])
+        except Exception as e:
+            print(f"构建全市场快照失败: {e}")
+        await asyncio.sleep(UNIVERSE_BUILD_INTERVAL if market_hours.in_session() else 600)
+
+def quote_version(live_data):
+    """估值版本：估值时间 + 估算净值（+ stale 标记），客户端据此判断该行是否有变化"""
+    version = f"{live_data.get('gztime', '')}|{live_data['currGSZ']:.4f}"
+    return version + "|stale" if live_data.get('stale') else version
+
+def rows_etag(rows, media_type=None):
+    """整组结果的弱 ETag：各行代码、金额和估值版本的摘要，不同编码格式的 ETag 不同"""
+    return versions_etag([(r.get('code'), r.get('amount'), r.get('version')) for r in rows], media_type)
+
+def versions_etag(items, media_type=None):
+    digest = hashlib.sha1(json.dumps([media_type, items] if media_type else items, ensure_ascii=False).encode())
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+def not_modified(request, etag):
+    return etag in request.headers.get("if-none-match", "")
+
+def quote_age(live_data):
+    """估值距抓取时的秒数，旧快照中没有抓取时间时为 None"""
+    fetched_at = live_data.get('fetchedAt')
+    return round(time.time() - fetched_at, 1) if fetched_at else None
+
+def realtime_profit(amount, live_data):
+    shares = amount / live_data['prevJZ'] if amount > 0 else 0
+    return round(shares * (live_data['currGSZ'] - live_data['prevJZ']), 2)
+
+def holding_row(holding, live_data):
+    """由行情计算单个持仓的实时收益，holding: {'code', 'name', 'amount', 'holdProfit'}"""
+    amount = holding['amount']
+    return {
+        "name": holding['name'],
+        "code": holding['code'],
+        "realtimeChange": round(live_data['gszzl'], 2),
+        "realtimeProfit": realtime_profit(amount, live_data),
+        "holdProfit": holding.get('holdProfit', 0.0),
+        "amount": amount,
+        "stale": live_data.get('stale', False),
+        "age": quote_age(live_data),
+        "version": quote_version(live_data)
+    }
 
-executor = ThreadPoolExecutor(max_workers=20)
+def holding_columns(holdings, quotes, previous=None, names=True, media_type=None):
+    """
+    与 holding_row 相同的计算，直接按列输出（紧凑编码用），不为每行创建字典，返回 (列, ETag)
+    previous：delta 模式下客户端回传的行，估值版本和实时收益都未变的行不输出
+    未取到行情的行沿用持仓中已有的涨跌幅和收益（没有时为 0）并标记 stale
+    """
+    columns = compact_codec.Columns()
+    etag_items = []
+    for i, h in enumerate(holdings):
+        code, amount = h['code'], h['amount']
+        live_data = quotes.get(code)
+        if live_data:
+            change, profit = round(live_data['gszzl'], 2), realtime_profit(amount, live_data)
+            version, stale, age = quote_version(live_data), live_data.get('stale', False), quote_age(live_data)
+        else:
+            change, profit = h.get('realtimeChange', 0.0), h.get('realtimeProfit', 0.0)
+            version, stale, age = h.get('version'), True, None
+        etag_items.append((code, amount, version))
+        if previous is not None and version == previous[i].get('version') and profit == previous[i].get('realtimeProfit'):
+            continue
+        columns.append(code, version or "", stale, change, profit, h.get('holdProfit', 0.0), amount, age)
+        if names:
+            columns.names[code] = h.get('name') or fund_name(code)
+    return columns, versions_etag(etag_items, media_type)
+
+def compact_response(request, media_type, columns, meta, etag):
+    """紧凑编码响应，按 Accept-Encoding 压缩"""
+    body, encoding = compact_codec.compress(compact_codec.encode(media_type, columns, meta),
+                                            request.headers.get("accept-encoding"))
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
 
-def fetch_single_fund_sync(fund_code, amount):
-    """同步抓取单支基金数据的包装函数"""
-    live_data = get_fund_info_ths(fund_code)
+async def fetch_single_fund(fund_code, amount):
+    """抓取单支基金数据并计算实时收益"""
+    live_data = await get_quote(fund_code)
     if live_data:
-        shares = amount / live_data['prevJZ'] if amount > 0 else 0
-        realtime_profit = shares * (live_data['currGSZ'] - live_data['prevJZ'])
-        # 优先从缓存获取名称，否则使用默认名称
-        matched_name = next((name for name, c in FUND_CACHE.items() if c == fund_code), f"基金({fund_code})")
-        return {
-            "name": matched_name,
-            "code": fund_code,
-            "realtimeChange": round(live_data['gszzl'], 2),
-            "realtimeProfit": round(realtime_profit, 2),
-            "holdProfit": 0.0,
-            "amount": amount
-        }
+        return holding_row({'code': fund_code, 'name': fund_name(fund_code), 'amount': amount, 'holdProfit': 0.0}, live_data)
     return None
 
-@app.post("/api/resolve")
-async def resolve_text(req: ResolveRequest):
+# 名称搜索阶段的总时限（秒），超时未返回的名称按未识别处理
+RESOLVE_NAME_DEADLINE = float(os.environ.get("RESOLVE_NAME_DEADLINE", 8))
+
+def match_known_name(line):
+    """在全行中匹配已知缓存（兼容短名称），返回 (代码, 名称, 金额搜索区域)"""
+    hit = known_names.longest_match(line)
+    if not hit:
+        return None, None, None
+    name, c = hit
+    # 尝试定位金额搜索区域
+    match_pos = line.find(name[:4])
+    search_text = line[match_pos + len(name):] if match_pos != -1 else None
+    return c, name, search_text
+
+def extract_amount(search_text, found_code):
+    """从文本中提取持仓金额"""
+    nums = AMOUNT_RE.findall(search_text)
+    for n in reversed(nums):
+        val_str = n.replace(',', '')
+        if val_str == found_code: continue
+        try:
+            val = float(val_str)
+            if val > 0.1:
+                return val
+        except: continue
+    return 0.0
+
+async def fetch_with_name(code, name, amt):
+    try:
+        live_data = await get_quote(code)
+        if live_data:
+            shares = amt / live_data['prevJZ'] if amt > 0 else 0
+            realtime_profit = shares * (live_data['currGSZ'] - live_data['prevJZ'])
+            return {
+                "name": name,
+                "code": code,
+                "realtimeChange": round(live_data['gszzl'], 2),
+                "realtimeProfit": round(realtime_profit, 2),
+                "holdProfit": 0.0,
+                "amount": amt,
+                "status": "success",
+                "stale": live_data.get('stale', False),
+                "age": quote_age(live_data)
+            }
+    except: pass
+    return {
+        "name": name,
+        "code": code,
+        "realtimeChange": 0.0,
+        "realtimeProfit": 0.0,
+        "holdProfit": 0.0,
+        "amount": amt,
+        "status": "partial"
+    }
+
+def split_lines(text):
+    """统一分隔符并拆分为非空行"""
     # 处理各种分隔符
-    raw_text = req.text.replace('：', ':').replace('元', '').replace('（', '(').replace('）', ')')
-    lines = raw_text.split('\n')
+    raw_text = text.replace('：', ':').replace('元', '').replace('（', '(').replace('）', ')')
+    return [line.strip() for line in raw_text.split('\n') if line.strip()]
+
+def make_line_resolver():
+    """
+    创建单次请求使用的行解析器
+    请求内相同名称只搜索一次，整个名称搜索阶段受 RESOLVE_NAME_DEADLINE 限制
+    返回 (resolve_line, close)，请求结束时调用 close 取消未完成的搜索
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RESOLVE_NAME_DEADLINE
+    searches = {}
     
-    to_fetch = []
-    loop = asyncio.get_event_loop()
+    async def search_before_deadline(potential_name):
+        task = searches.get(potential_name)
+        if task is None:
+            print(f"尝试识别基金名称: {potential_name}")
+            task = searches[potential_name] = asyncio.ensure_future(search_fund_by_name(potential_name))
+        try:
+            with phase("resolve"):
+                return await asyncio.wait_for(asyncio.shield(task), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            print(f"搜索基金超时: {potential_name}")
+            return None, None
     
-    for line in lines:
-        line = line.strip()
-        if not line: continue
-        
+    async def resolve_line(line):
+        """解析单行：识别代码/名称并提取金额，识别成功后立即开始抓取行情"""
         found_code = None
         found_name = None
         search_text = line
+        potential_name = None
         
-        # 1. 优先尝试提取 6 位连续数字作为代码
-        code_match = re.search(r'\b\d{6}\b', line)
-        if code_match:
-            found_code = code_match.group(0)
-            # 尝试获取名称
-            found_name = next((name for name, c in FUND_CACHE.items() if c == found_code), f"基金({found_code})")
-            search_text = line[code_match.end():]
-        else:
-            # 2. 尝试从行中提取潜在的基金名称并搜索
-            # 匹配模式：[序号.] 基金名称 [:：\s] 金额
-            # 排除掉行首的数字序号，提取中间的非数字字符串作为关键词
-            name_match = re.search(r'^\s*(?:\d+[\.、\s]+)?(.*?)\s*[:：\s]\s*(\d.*)$', line)
-            if name_match:
-                potential_name = name_match.group(1).strip()
-                if potential_name:
-                    print(f"尝试公开搜索基金: {potential_name}")
-                    found_code, found_name = search_fund_by_name(potential_name)
-                    search_text = name_match.group(2)
-        
-        # 如果还是没找到，尝试在全行中匹配已知缓存（兼容短名称）
-        if not found_code:
-            clean_line = line.replace(" ", "")
-            sorted_names = sorted(FUND_CACHE.items(), key=lambda x: len(x[0]), reverse=True)
-            for name, c in sorted_names:
-                if name.replace(" ", "") in clean_line:
-                    found_name = name
-                    found_code = c
-                    # 尝试定位金额搜索区域
-                    match_pos = line.find(name[:4])
-                    if match_pos != -1:
-                        search_text = line[match_pos + len(name):]
-                    break
+        with phase("parse"):
+            # 1. 优先尝试提取 6 位连续数字作为代码
+            code_match = CODE_RE.search(line)
+            if code_match:
+                found_code = code_match.group(0)
+                # 尝试获取名称
+                found_name = fund_name(found_code)
+                search_text = line[code_match.end():]
+            else:
+                # 2. 尝试从行中提取潜在的基金名称并搜索
+                # 排除掉行首的数字序号，提取中间的非数字字符串作为关键词
+                name_match = NAME_LINE_RE.search(line)
+                if name_match:
+                    potential_name = name_match.group(1).strip()
+        if potential_name:
+            found_code, found_name = await search_before_deadline(potential_name)
+            search_text = name_match.group(2)
         
-        if found_code:
-            # 3. 提取金额
-            nums = re.findall(r'[+-]?\d[\d,]*\.?\d+', search_text)
-            amount = 0.0
-            for n in reversed(nums):
-                val_str = n.replace(',', '')
-                if val_str == found_code: continue
-                try:
-                    val = float(val_str)
-                    if val > 0.1:
-                        amount = val
-                        break
-                except: continue
+        with phase("parse"):
+            # 如果还是没找到，尝试在全行中匹配已知缓存（兼容短名称）
+            if not found_code:
+                found_code, found_name, known_text = match_known_name(line)
+                if known_text is not None:
+                    search_text = known_text
             
-            to_fetch.append((found_code, found_name, amount))
+            if not found_code:
+                return None
+            subscribe([found_code])
+            # 3. 提取金额
+            amount = extract_amount(search_text, found_code)
+        return await fetch_with_name(found_code, found_name, amount)
+    
+    def close():
+        for task in searches.values():
+            task.cancel()
+    
+    return resolve_line, close
 
-    if not to_fetch:
-        return {"data": []}
-        
-    def fetch_with_name(code, name, amt):
-        try:
-            live_data = get_fund_info_ths(code)
-            if live_data:
-                shares = amt / live_data['prevJZ'] if amt > 0 else 0
-                realtime_profit = shares * (live_data['currGSZ'] - live_data['prevJZ'])
-                return {
-                    "name": name,
-                    "code": code,
-                    "realtimeChange": round(live_data['gszzl'], 2),
-                    "realtimeProfit": round(realtime_profit, 2),
-                    "holdProfit": 0.0,
-                    "amount": amt,
-                    "status": "success"
-                }
-        except: pass
-        return {
-            "name": name,
-            "code": code,
-            "realtimeChange": 0.0,
-            "realtimeProfit": 0.0,
-            "holdProfit": 0.0,
-            "amount": amt,
-            "status": "partial"
-        }
+def start_timing():
+    timing = metrics.RequestTiming()
+    metrics.current_timing.set(timing)
+    return timing
 
-    futures = [loop.run_in_executor(executor, fetch_with_name, c, n, a) for c, n, a in to_fetch]
-    results = await asyncio.gather(*futures)
+def finish_timing(endpoint, timing, response, include):
+    """记录各阶段耗时；include 为真时（请求带 ?timing=1）在响应中附带毫秒数"""
+    durations = timing.durations()
+    for name in metrics.PHASES:
+        REQUEST_PHASE.observe(durations[name], endpoint, name)
+    if include:
+        response["timing"] = {k: round(v * 1000, 2) for k, v in durations.items()}
+    return response
+
+@app.post("/api/resolve")
+async def resolve_text(req: ResolveRequest, timing: bool = False):
+    request_timing = start_timing()
+    with phase("parse"):
+        lines = split_lines(req.text)
+    resolve_line, close = make_line_resolver()
+    try:
+        results = await asyncio.gather(*(resolve_line(line) for line in lines))
+    finally:
+        close()
     
-    resolved_funds = [r for r in results if r is not None]
-    print(f"解析完成：提交 {len(to_fetch)} 条，成功返回 {len(resolved_funds)} 条")
-    return {"data": resolved_funds}
+    with phase("assemble"):
+        resolved_funds = [r for r in results if r is not None]
+        response = {"data": resolved_funds}
+    RESOLVE_PARSE.observe(request_timing.durations()["parse"])
+    print(f"解析完成：提交 {len(lines)} 条，成功返回 {len(resolved_funds)} 条")
+    return finish_timing("/api/resolve", request_timing, response, timing)
 
 @app.post("/api/refresh")
-async def refresh_funds(funds: List[dict]):
-    """并行刷新持仓列表"""
-    loop = asyncio.get_event_loop()
-    futures = [loop.run_in_executor(executor, fetch_single_fund_sync, f['code'], f['amount']) for f in funds]
-    results = await asyncio.gather(*futures)
-    updated_funds = [r if r else f for r, f in zip(results, funds)]
-    return {"data": updated_funds}
+async def refresh_funds(funds: List[dict], request: Request, response: Response,
+                        timing: bool = False, delta: bool = False, deadline_ms: Optional[int] = None,
+                        names: bool = True):
+    """
+    并行刷新持仓列表
+    deadline_ms：最多等待的毫秒数，超时的基金返回缓存旧值（stale 及 age），抓取在后台继续；
+    完全取不到行情的行原样返回客户端提交的数据并标记 stale
+    delta=1 时客户端回传上次收到的行（含 version），只返回有变化的行，全部未变时返回 304；
+    也可带 If-None-Match（上次响应的 ETag），整组未变时返回 304
+    Accept 为 application/x-fund-columns 或 application/msgpack 时返回紧凑列式编码（见 compact_codec），
+    names=0 表示客户端已缓存名称，不再下发
+    """
+    request_timing = start_timing()
+    codes = [f['code'] for f in funds]
+    subscribe(codes)
+    quotes = await get_quotes_within(codes, deadline_seconds(deadline_ms))
+    media_type = compact_codec.negotiate(request.headers.get("accept"))
+    if media_type:
+        with phase("assemble"):
+            columns, etag = holding_columns(funds, quotes, funds if delta else None, names, media_type)
+            if not_modified(request, etag) or (delta and not columns):
+                return Response(status_code=304, headers={"ETag": etag})
+            meta = finish_timing("/api/refresh", request_timing,
+                                 {"unchanged": len(funds) - len(columns)} if delta else {}, timing)
+            return compact_response(request, media_type, columns, meta, etag)
+    with phase("assemble"):
+        updated_funds = [
+            holding_row({'code': f['code'], 'name': fund_name(f['code']), 'amount': f['amount'], 'holdProfit': 0.0},
+                        quotes[f['code']])
+            if quotes.get(f['code']) else {**f, "stale": True}
+            for f in funds
+        ]
+        etag = rows_etag(updated_funds)
+        if not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        if delta:
+            # 估值版本变化，或客户端改了金额导致收益不同，才需要下发
+            changed = [r for r, f in zip(updated_funds, funds)
+                       if r.get('version') != f.get('version') or r.get('realtimeProfit') != f.get('realtimeProfit')]
+            if not changed:
+                return Response(status_code=304, headers={"ETag": etag})
+            body = {"data": changed, "unchanged": len(funds) - len(changed)}
+        else:
+            body = {"data": updated_funds}
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept"
+    return finish_timing("/api/refresh", request_timing, body, timing)
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def portfolio_summary(rows):
+    """组合汇总：总金额、当日实时收益及加权涨跌幅"""
+    return summarize(len(rows), sum(r.get('amount') or 0 for r in rows), sum(r.get('realtimeProfit') or 0 for r in rows))
+
+def summarize(count, total_amount, total_profit):
+    return {
+        "count": count,
+        "totalAmount": round(total_amount, 2),
+        "totalRealtimeProfit": round(total_profit, 2),
+        "realtimeChange": round(total_profit / total_amount * 100, 2) if total_amount else 0.0,
+    }
+
+async def stream_as_completed(coros, on_result=None):
+    """按完成顺序推送结果，每条附带原始序号 index，最后推送汇总"""
+    async def indexed(i, coro):
+        return i, await coro
+    
+    tasks = [asyncio.ensure_future(indexed(i, c)) for i, c in enumerate(coros)]
+    rows = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            i, row = await next_done
+            if on_result:
+                row = on_result(i, row)
+            if row is None:
+                continue
+            rows.append(row)
+            yield sse_event("fund", {"index": i, **row})
+        yield sse_event("summary", portfolio_summary(rows))
+    finally:
+        # 客户端断开时取消尚未完成的抓取
+        for task in tasks:
+            task.cancel()
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/api/refresh/stream")
+async def refresh_funds_stream(funds: List[dict]):
+    """流式刷新：每支基金抓取完成即推送 (text/event-stream)"""
+    subscribe(f['code'] for f in funds)
+    coros = [fetch_single_fund(f['code'], f['amount']) for f in funds]
+    return StreamingResponse(
+        stream_as_completed(coros, on_result=lambda i, r: r if r else funds[i]),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+@app.post("/api/resolve/stream")
+async def resolve_text_stream(req: ResolveRequest):
+    """流式解析：每行识别并抓取完成即推送 (text/event-stream)"""
+    lines = split_lines(req.text)
+    resolve_line, close = make_line_resolver()
+    
+    async def events():
+        try:
+            async for event in stream_as_completed([resolve_line(line) for line in lines]):
+                yield event
+        finally:
+            close()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def portfolio_quotes(holdings, deadline=None):
+    """按组合内去重后的代码取共享行情表"""
+    codes = list(dict.fromkeys(h['code'] for h in holdings))
+    subscribe(codes)
+    return await get_quotes_within(codes, deadline)
+
+async def portfolio_response(portfolio_id, holdings, deadline=None):
+    """逐行计算组合收益；未取到行情的行标记 partial"""
+    quotes = await portfolio_quotes(holdings, deadline)
+    rows = []
+    for h in holdings:
+        live_data = quotes.get(h['code'])
+        if live_data:
+            rows.append(holding_row(h, live_data))
+        else:
+            rows.append({**h, "realtimeChange": 0.0, "realtimeProfit": 0.0, "status": "partial", "stale": True})
+    return {"id": portfolio_id, "data": rows, "summary": portfolio_summary(rows)}
+
+def with_names(holdings):
+    """未带名称的持仓按代码补全名称"""
+    return [{**h, 'name': h.get('name') or fund_name(str(h.get('code', '')).strip())} for h in holdings]
+
+async def load_portfolio(portfolio_id):
+    """取组合持仓并记录访问；共享模式下以快照库为准，其他 worker 的登记、修改和删除立即可见"""
+    if SHARED_CACHE:
+        row = await asyncio.to_thread(snapshot_store.load_portfolio, portfolio_id)
+        if row is None:
+            portfolio_registry.delete(portfolio_id)
+            return None
+        portfolio_registry.put(portfolio_id, *row)
+    holdings = portfolio_registry.get(portfolio_id)
+    if holdings is not None:
+        snapshot_store.touch_portfolio(portfolio_id)
+    return holdings
+
+@app.post("/api/portfolios")
+async def create_portfolio(holdings: List[dict]):
+    """登记组合，返回组合 ID 及当前估值"""
+    portfolio_id = portfolio_registry.create(with_names(holdings))
+    saved = portfolio_registry.get(portfolio_id)
+    snapshot_store.save_portfolio(portfolio_id, saved)
+    return await portfolio_response(portfolio_id, saved)
+
+@app.get("/api/portfolios/stats")
+async def portfolios_stats():
+    """组合数、持仓总数及去重后的基金数"""
+    return portfolio_registry.stats()
+
+@app.get("/api/portfolios/{portfolio_id}")
+async def get_portfolio(portfolio_id: str, request: Request, response: Response, deadline_ms: Optional[int] = None,
+                        names: bool = True):
+    """
+    按组合 ID 刷新估值；deadline_ms 同 /api/refresh；带 If-None-Match 且估值均未变化时返回 304
+    Accept、names 同 /api/refresh，紧凑编码时 id 和汇总放在附加信息中
+    """
+    holdings = await load_portfolio(portfolio_id)
+    if holdings is None:
+        raise HTTPException(status_code=404, detail="组合不存在")
+    media_type = compact_codec.negotiate(request.headers.get("accept"))
+    if media_type:
+        quotes = await portfolio_quotes(holdings, deadline_seconds(deadline_ms))
+        columns, etag = holding_columns(holdings, quotes, names=names, media_type=media_type)
+        if not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        summary = summarize(len(columns), sum(columns.floats["amount"]), sum(columns.floats["realtimeProfit"]))
+        return compact_response(request, media_type, columns, {"id": portfolio_id, "summary": summary}, etag)
+    body = await portfolio_response(portfolio_id, holdings, deadline_seconds(deadline_ms))
+    etag = rows_etag(body["data"])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    # no-cache：浏览器每次带 If-None-Match 重新验证，未变化时直接复用本地缓存的响应
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept"
+    return body
+
+@app.put("/api/portfolios/{portfolio_id}")
+async def replace_portfolio(portfolio_id: str, holdings: List[dict]):
+    """整体替换组合持仓"""
+    if await load_portfolio(portfolio_id) is None or not portfolio_registry.replace(portfolio_id, with_names(holdings)):
+        raise HTTPException(status_code=404, detail="组合不存在")
+    saved = portfolio_registry.get(portfolio_id)
+    snapshot_store.save_portfolio(portfolio_id, saved)
+    return await portfolio_response(portfolio_id, saved)
+
+@app.delete("/api/portfolios/{portfolio_id}")
+async def delete_portfolio(portfolio_id: str):
+    if await load_portfolio(portfolio_id) is None or not portfolio_registry.delete(portfolio_id):
+        raise HTTPException(status_code=404, detail="组合不存在")
+    snapshot_store.delete_portfolio(portfolio_id)
+    return {"id": portfolio_id, "deleted": True}
+
+@app.get("/api/history/{code}")
+async def fund_history(code: str):
+    """
+    当日分时估值曲线（内存中）；没有或已过期时直接向同花顺增量抓取，
+    不依赖估值请求（估值可能来自缓存、重启恢复的快照或其他数据源，不会更新曲线）
+    """
+    curve = intraday_store.get(code)
+    if curve is None or not intraday_fresh(curve):
+        try:
+            curve = await fetch_intraday(code) or curve
+        except Exception as e:
+            print(f"获取分时数据失败 {code}: {e}")
+    if curve is None:
+        raise HTTPException(status_code=404, detail="暂无该基金分时数据")
+    return {"code": code, **curve.to_dict()}
+
+# 指标 (Prometheus 文本格式，GET /metrics)
+registry = metrics.Registry()
+HTTP_LATENCY = registry.histogram(
+    "fund_http_request_duration_seconds", "接口请求耗时（流式接口为首字节耗时）", ("method", "path", "status"))
+REQUEST_PHASE = registry.histogram(
+    "fund_request_phase_seconds", "单次请求各阶段耗时 (parse/resolve/fetch/assemble)", ("endpoint", "phase"))
+RESOLVE_PARSE = registry.histogram(
+    "fund_resolve_parse_seconds", "/api/resolve 文本解析耗时", buckets=metrics.PARSE_BUCKETS)
+UPSTREAM_LATENCY = registry.histogram("fund_upstream_request_duration_seconds", "上游请求耗时", ("host",))
+UPSTREAM_ERRORS = registry.counter("fund_upstream_errors_total", "上游请求错误数", ("host", "kind"))
+
+def observe_upstream(host, seconds, error):
+    if error is None:
+        UPSTREAM_LATENCY.observe(seconds, host)
+    else:
+        UPSTREAM_ERRORS.inc(host, error)
+
+http_pool.observers.append(observe_upstream)
+
+def pool_gauge(key, transform=lambda v: v):
+    return lambda: [((host, ), transform(stats[key])) for host, stats in http_pool.pool_stats().items()]
+
+# 原线程池已由异步连接池取代，排队深度/活动数即各域名连接池的等待数/并发数
+registry.gauge("fund_upstream_waiting", "等待并发名额的上游请求数（排队深度）", pool_gauge("waiting"), ("host",))
+registry.gauge("fund_upstream_active", "进行中的上游请求数", pool_gauge("active"), ("host",))
+registry.gauge("fund_upstream_circuit_open", "上游熔断状态（1 为熔断中）",
+               pool_gauge("circuit", lambda state: int(state == "open")), ("host",))
+registry.gauge("fund_upstream_rate_limit", "上游当前限速（次/秒，+Inf 为未限速）",
+               pool_gauge("rate", lambda rate: float("inf") if rate is None else rate), ("host",))
+registry.gauge("fund_quote_cache_requests_total", "行情缓存查询数",
+               lambda: [((kind,), quote_cache.stats()[kind]) for kind in ("hits", "misses", "coalesced")],
+               ("result",), kind="counter")
+registry.gauge("fund_quote_cache_hit_ratio", "行情缓存命中率", lambda: [((), quote_cache.stats()["hitRate"])])
+registry.gauge("fund_quote_cache_size", "行情缓存条目数", lambda: [((), quote_cache.stats()["size"])])
+registry.gauge("fund_source_requests_total", "各估值数据源请求数",
+               lambda: [((n,), s.requests) for n, s in source_router.stats.items()], ("source",), kind="counter")
+registry.gauge("fund_source_wins_total", "各估值数据源被采用次数",
+               lambda: [((n,), s.wins) for n, s in source_router.stats.items()], ("source",), kind="counter")
+registry.gauge("fund_source_hedged_total", "对冲请求次数", lambda: [((), source_router.hedged)], kind="counter")
+registry.gauge("fund_poller_subscriptions", "后台轮询中的基金数", lambda: [((), len(poller.subscriptions))])
+registry.gauge("fund_revalidating", "超过时限后仍在后台抓取的请求数", lambda: [((), len(revalidating))])
+registry.gauge("fund_portfolios", "服务端登记的组合数", lambda: [((), len(portfolio_registry.portfolios))])
+registry.gauge("fund_universe_priced", "全市场快照中有估值的基金数", lambda: [((), universe.priced)])
+registry.gauge("fund_is_leader", "本 worker 是否为主节点（负责后台抓取）", lambda: [((), int(is_leader()))])
+registry.gauge("fund_portfolio_distinct_codes", "所有组合去重后的基金数", lambda: [((), len(portfolio_registry.refcounts))])
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_LATENCY.observe(time.perf_counter() - started, request.method,
+                             route.path if route else "unmatched", str(status))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """行情缓存命中统计"""
+    return quote_cache.stats()
+
+@app.get("/api/sources/stats")
+async def sources_stats():
+    """各估值数据源的耗时、错误率及对冲次数"""
+    return source_router.stats_dict()
+
+@app.get("/api/upstream/stats")
+async def upstream_stats():
+    """各上游域名的并发、熔断状态及当前限速"""
+    return http_pool.pool_stats()
+
+@app.get("/api/poller/stats")
+async def poller_stats():
+    """后台轮询状态"""
+    return poller.stats()
+
+@app.get("/api/universe/top")
+async def universe_top(n: int = 20, order: str = "desc", category: Optional[str] = None, company: Optional[str] = None,
+                       min_change: Optional[float] = None, max_change: Optional[float] = None, offset: int = 0):
+    """
+    全市场涨跌幅排行：order=desc 为涨幅榜，asc 为跌幅榜
+    可按类型（如“指数型-股票”或粗分类“指数型”）、基金公司及涨跌幅区间 [min_change, max_change] 过滤，offset 分页
+    """
+    if order not in ("desc", "asc"):
+        raise HTTPException(status_code=400, detail="order 只能为 desc 或 asc")
+    snapshot = universe
+    total, rows = snapshot.query(max(0, min(n, UNIVERSE_MAX_N)), order, category, company,
+                                 min_change, max_change, max(0, offset))
+    return {"updated": snapshot.updated, "total": total, "data": rows}
+
+@app.get("/api/universe/categories")
+async def universe_categories():
+    """各类型有估值的基金数"""
+    return universe.counts(universe.by_category)
+
+@app.get("/api/universe/companies")
+async def universe_companies():
+    """各基金公司有估值的基金数（公司按名称前缀推断）"""
+    return universe.counts(universe.by_company)
+
+@app.get("/api/universe/stats")
+async def universe_stats():
+    snapshot = universe
+    return {"enabled": UNIVERSE_ENABLED, "funds": len(snapshot), "priced": snapshot.priced, "updated": snapshot.updated, "fetch": universe_poller.stats()}
+
+@app.get("/api/workers/stats")
+async def workers_stats():
+    """当前 worker 的进程号、是否主节点及从共享快照库同步的条数"""
+    return {"pid": os.getpid(), "workers": WORKERS, "shared": SHARED_CACHE, "leader": is_leader(), **shared_stats}
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if WORKERS > 1:
+        # 多进程需以导入路径启动，各 worker 分别导入本模块
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
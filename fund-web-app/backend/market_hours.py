@@ -0,0 +1,113 @@
+import os
+import re
+import datetime
+
+# A 股交易时段（北京时间，无夏令时，直接使用固定时区）
+CN_TZ = datetime.timezone(datetime.timedelta(hours=8))
+SESSIONS = [
+    (datetime.time(9, 30), datetime.time(11, 30)),
+    (datetime.time(13, 0), datetime.time(15, 0)),
+]
+# 收盘后多轮询几分钟，拿到 15:00 的最终估值
+CLOSE_GRACE = datetime.timedelta(minutes=3)
+
+
+def _load_holidays():
+    """
+    节假日休市日期，格式 YYYY-MM-DD
+    MARKET_HOLIDAYS: 逗号分隔的日期；MARKET_HOLIDAYS_FILE: 每行一个日期的文本文件
+    """
+    days = set()
+    for item in os.environ.get("MARKET_HOLIDAYS", "").split(","):
+        if item.strip():
+            days.add(datetime.date.fromisoformat(item.strip()))
+    path = os.environ.get("MARKET_HOLIDAYS_FILE")
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#")[0].strip()
+                if line:
+                    days.add(datetime.date.fromisoformat(line))
+    return days
+
+
+HOLIDAYS = _load_holidays()
+
+
+def now_cn():
+    return datetime.datetime.now(CN_TZ)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in HOLIDAYS
+
+
+def in_session(now=None, grace=CLOSE_GRACE):
+    """当前是否处于交易时段（含收盘后的宽限时间）"""
+    now = now or now_cn()
+    if not is_trading_day(now.date()):
+        return False
+    for start, end in SESSIONS:
+        session_start = now.replace(hour=start.hour, minute=start.minute, second=0, microsecond=0)
+        session_end = now.replace(hour=end.hour, minute=end.minute, second=0, microsecond=0) + grace
+        if session_start <= now < session_end:
+            return True
+    return False
+
+
+def next_session_start(now=None):
+    """下一个交易时段的开始时间；正处于交易时段时返回 now"""
+    now = now or now_cn()
+    if in_session(now):
+        return now
+    day = now.date()
+    for _ in range(30):
+        if is_trading_day(day):
+            for start, _end in SESSIONS:
+                candidate = datetime.datetime.combine(day, start, tzinfo=CN_TZ)
+                if candidate > now:
+                    return candidate
+        day += datetime.timedelta(days=1)
+    return now + datetime.timedelta(days=1)
+
+
+# 估值时间末尾的具体时刻：同花顺 "0930"，天天基金 "15:00"
+ESTIMATE_TIME_RE = re.compile(r"\d{2}:?\d{2}$")
+
+
+def estimate_is_stale(change, gztime, now=None):
+    """
+    交易日开盘后，估值时间不是当天（数据源停更）视为可疑；
+    当天的估值只有在涨跌幅恰好为 0 且没有具体时刻（同花顺空曲线的 "日期 实时"）时才可疑，
+    开盘第一个点（估值等于昨日净值）和债券、货币基金真实的平盘估值都带有当天的时刻，不算可疑
+    """
+    now = now or now_cn()
+    if not is_trading_day(now.date()) or now.time() < SESSIONS[0][0]:
+        return False
+    if not gztime.startswith(now.date().isoformat()):
+        return True
+    return abs(change) < 1e-9 and not ESTIMATE_TIME_RE.search(gztime)
+
+
+def seconds_until_session(now=None):
+    now = now or now_cn()
+    return max(0.0, (next_session_start(now) - now).total_seconds())
+
+
+def last_close(now=None):
+    """
+    最近一次收盘（含午间休市）的时间；交易时段内返回 None
+    在此之后抓取的估值直到下一个交易时段开始前都不会再变化
+    """
+    now = now or now_cn()
+    if in_session(now):
+        return None
+    day = now.date()
+    for _ in range(30):
+        if is_trading_day(day):
+            for _start, end in reversed(SESSIONS):
+                candidate = datetime.datetime.combine(day, end, tzinfo=CN_TZ) + CLOSE_GRACE
+                if candidate <= now:
+                    return candidate
+        day -= datetime.timedelta(days=1)
+    return None
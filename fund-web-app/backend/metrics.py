@@ -0,0 +1,173 @@
+"""
+轻量指标收集，输出 Prometheus 文本格式 (text/plain; version=0.0.4)
+另外提供单次请求的分阶段耗时统计 (parse / resolve / fetch / assemble)
+"""
+import time
+import bisect
+import contextvars
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PARSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}   # labels -> [各桶计数..., 总和, 总数]
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """
+    抓取时通过回调取值：collect() 返回 [(标签值元组, 数值)]
+    其他模块已有的累计计数（如缓存命中数）用 kind="counter" 导出
+    """
+
+    def __init__(self, name, help, collect, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, collect, labels=(), kind="gauge"):
+        return self.register(Gauge(name, help, collect, labels, kind))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+PHASES = ("parse", "resolve", "fetch", "assemble")
+
+
+class RequestTiming:
+    """
+    单次请求的分阶段耗时
+    各行并发处理时同一阶段的时间段会重叠，按时间段并集计算，即该阶段实际占用的墙钟时间
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {phase: [] for phase in PHASES}
+
+    @contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[phase].append((start, time.perf_counter()))
+
+    def durations(self):
+        result = {}
+        for phase, spans in self.spans.items():
+            total, end = 0.0, None
+            for s, e in sorted(spans):
+                if end is None or s > end:
+                    total += e - s
+                    end = e
+                elif e > end:
+                    total += e - end
+                    end = e
+            result[phase] = total
+        result["total"] = time.perf_counter() - self.started
+        return result
+
+
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+
+@contextmanager
+def phase(name):
+    """在当前请求的耗时统计中记录一个阶段；没有进行中的统计时不做任何事"""
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+    with timing.span(name):
+        yield
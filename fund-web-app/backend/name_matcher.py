@@ -0,0 +1,137 @@
+from collections import deque
+
+# 新名称先放入小的增量自动机，超过主自动机名称数的 1/MERGE_RATIO（且不少于 MERGE_MIN）时合并重建主自动机
+MERGE_RATIO = 8
+MERGE_MIN = 64
+
+
+class _Automaton:
+    """
+    构建后结构不变的 Aho-Corasick 自动机
+    节点上只记录“在此结束的名称”所在节点号，名称对应的代码可原地更新而不必重建
+    """
+
+    def __init__(self, entries):
+        self.goto = [{}]      # 节点 -> {字符: 子节点}
+        self.entry = [None]   # 在该节点结束的名称 (名称, 代码)
+        self.depth = [0]
+        for key, value in entries.items():
+            node = 0
+            for ch in key:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.entry.append(None)
+                    self.depth.append(self.depth[node] + 1)
+                node = nxt
+            self.entry[node] = value
+        self._build()
+
+    def _build(self):
+        """广度优先计算失败指针，以及每个节点沿失败链可输出的最长名称（节点号，0 表示无）"""
+        goto, entry = self.goto, self.entry
+        self.fail = fail = [0] * len(goto)
+        self.best = best = [0] * len(goto)
+        queue = deque()
+        for child in goto[0].values():
+            best[child] = child if entry[child] else 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                # 在本节点结束的名称一定比失败链上的更长
+                best[child] = child if entry[child] else best[fail[child]]
+                queue.append(child)
+
+    def find(self, key):
+        """key 作为名称存在时返回其节点号，否则返回 None"""
+        node = 0
+        for ch in key:
+            node = self.goto[node].get(ch)
+            if node is None:
+                return None
+        return node if self.entry[node] else None
+
+    def longest(self, text):
+        """返回 (长度, (名称, 代码))，没有匹配时长度为 0"""
+        goto, fail, best, depth = self.goto, self.fail, self.best, self.depth
+        node = 0
+        found = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = best[node]
+            if hit and depth[hit] > depth[found]:
+                found = hit
+        return depth[found], self.entry[found]
+
+
+class NameMatcher:
+    """
+    已知基金名称的多模式匹配自动机 (Aho-Corasick)，一次扫描整行即可找出其中最长的已知名称
+    增量更新：已有名称改代码时原地更新；新名称进入增量自动机，下次匹配前只重建这一小部分，
+    增量部分超过主自动机的 1/MERGE_RATIO 时才合并重建主自动机，新增名称的均摊重建代价为常数倍名称长度
+    名称只增不删（目录中下架的基金名称仍会被识别到原代码）
+    """
+
+    def __init__(self):
+        self._keys = {}                 # 去空格的名称 -> (名称, 代码)
+        self._main = _Automaton({})
+        self._pending = {}              # 尚未并入主自动机的名称
+        self._recent = _Automaton({})   # 由 _pending 构建，None 表示需重建
+        self.merges = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _put(self, name, code):
+        key = name.replace(" ", "")
+        if not key:
+            return
+        value = (name, code)
+        if self._keys.get(key) == value:
+            return
+        self._keys[key] = value
+        node = self._main.find(key)
+        if node is not None:
+            self._main.entry[node] = value
+        else:
+            self._pending[key] = value
+            self._recent = None
+
+    def _maybe_merge(self):
+        if len(self._pending) > max(MERGE_MIN, len(self._keys) // MERGE_RATIO):
+            self._main = _Automaton(self._keys)
+            self._pending = {}
+            self._recent = _Automaton({})
+            self.merges += 1
+
+    def add(self, name, code):
+        """加入一个名称（忽略空格），已存在时只更新代码"""
+        self._put(name, code)
+        self._maybe_merge()
+
+    def add_many(self, pairs):
+        """批量加入 (名称, 代码)（如整个基金目录），最多重建一次"""
+        for name, code in pairs:
+            self._put(name, code)
+        self._maybe_merge()
+
+    def longest_match(self, text):
+        """返回 text 中出现的最长已知名称 (名称, 代码)，没有则返回 None"""
+        text = text.replace(" ", "")
+        length, found = self._main.longest(text)
+        if self._pending:
+            if self._recent is None:
+                self._recent = _Automaton(self._pending)
+            recent_length, recent = self._recent.longest(text)
+            if recent_length > length:
+                found = recent
+        return found
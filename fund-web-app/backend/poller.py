@@ -0,0 +1,95 @@
+import time
+import zlib
+import asyncio
+
+import market_hours
+
+
+class QuotePoller:
+    """
+    后台行情轮询：交易时段内按固定节奏刷新客户端持有的基金，午休、收盘后及节假日休眠
+    每个周期内请求按代码哈希均匀错开，并限制每秒请求数，避免整分钟集中打到上游
+    轮询的基金 = 最近被请求过的基金 + pinned() 返回的常驻基金（如服务端登记的组合持仓，不受订阅过期影响）
+    """
+
+    def __init__(self, refresh, interval=60.0, rate=30.0, subscription_ttl=1800.0, pinned=None):
+        self.refresh = refresh                    # async (code) -> 行情
+        self.pinned = pinned or (lambda: ())      # () -> 常驻轮询的基金代码
+        self.interval = interval
+        self.rate = rate
+        self.subscription_ttl = subscription_ttl  # 超过该时间无客户端请求的基金不再轮询
+        self.subscriptions = {}                   # code -> 最近一次被请求的时间
+        self.cycles = 0
+        self.polled = 0
+        self.errors = 0
+        self.last_cycle_seconds = 0.0
+        self._tasks = set()
+
+    def touch(self, codes):
+        """登记客户端持有的基金代码"""
+        now = time.monotonic()
+        for code in codes:
+            self.subscriptions[code] = now
+
+    def active_codes(self):
+        expire_before = time.monotonic() - self.subscription_ttl
+        for code in [c for c, t in self.subscriptions.items() if t < expire_before]:
+            del self.subscriptions[code]
+        codes = set(self.subscriptions).union(self.pinned())
+        # 按哈希排序，每支基金在周期中的位置固定且分散
+        return sorted(codes, key=lambda c: zlib.crc32(c.encode()))
+
+    async def _poll_one(self, code):
+        try:
+            await self.refresh(code)
+            self.polled += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"后台刷新失败 {code}: {e}")
+
+    async def poll_cycle(self, codes):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        spacing = max(self.interval / len(codes), 1.0 / self.rate)
+        for i, code in enumerate(codes):
+            if not market_hours.in_session():
+                break
+            # 按计划时间发出，不受单个请求耗时影响
+            delay = started + i * spacing - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self._poll_one(code))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self.cycles += 1
+        self.last_cycle_seconds = round(loop.time() - started, 2)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = market_hours.seconds_until_session()
+            if wait > 0:
+                # 分段休眠，便于节假日配置或系统时间变化后及时恢复
+                await asyncio.sleep(min(wait, 600))
+                continue
+            codes = self.active_codes()
+            if not codes:
+                await asyncio.sleep(min(self.interval, 5))
+                continue
+            started = loop.time()
+            await self.poll_cycle(codes)
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+    def stats(self):
+        return {
+            "inSession": market_hours.in_session(),
+            "subscribed": len(self.subscriptions),
+            "pinned": len(set(self.pinned())),
+            "interval": self.interval,
+            "rate": self.rate,
+            "cycles": self.cycles,
+            "polled": self.polled,
+            "errors": self.errors,
+            "inflight": len(self._tasks),
+            "lastCycleSeconds": self.last_cycle_seconds,
+        }
@@ -0,0 +1,92 @@
+import time
+import secrets
+from collections import Counter
+
+
+def normalize_holdings(holdings):
+    """统一持仓格式 [{'code', 'name', 'amount', 'holdProfit'}]，同一代码的多行合并金额"""
+    merged = {}
+    for h in holdings:
+        code = str(h.get('code', '')).strip()
+        if not code:
+            continue
+        amount = float(h.get('amount') or 0)
+        hold_profit = float(h.get('holdProfit') or 0)
+        if code in merged:
+            merged[code]['amount'] += amount
+            merged[code]['holdProfit'] += hold_profit
+        else:
+            merged[code] = {'code': code, 'name': h.get('name') or code, 'amount': amount, 'holdProfit': hold_profit}
+    return list(merged.values())
+
+
+class PortfolioRegistry:
+    """
+    服务端组合登记：客户端登记一次持仓，之后凭 ID 刷新
+    按代码维护被多少个组合持有，行情只需按去重后的代码集合抓取
+    """
+
+    def __init__(self, idle_ttl=30 * 86400):
+        self.idle_ttl = idle_ttl   # 超过该时间未访问的组合会被清理
+        self.portfolios = {}       # id -> {'holdings': [...], 'updated': 时间戳, 'accessed': 时间戳}
+        self.refcounts = Counter()
+
+    def _index(self, holdings, delta):
+        for h in holdings:
+            self.refcounts[h['code']] += delta
+            if self.refcounts[h['code']] <= 0:
+                del self.refcounts[h['code']]
+
+    def put(self, portfolio_id, holdings, updated=None):
+        old = self.portfolios.get(portfolio_id)
+        if old:
+            self._index(old['holdings'], -1)
+        now = time.time()
+        self.portfolios[portfolio_id] = {'holdings': holdings, 'updated': updated or now, 'accessed': now}
+        self._index(holdings, 1)
+
+    def create(self, holdings):
+        portfolio_id = secrets.token_urlsafe(9)
+        self.put(portfolio_id, normalize_holdings(holdings))
+        return portfolio_id
+
+    def replace(self, portfolio_id, holdings):
+        if portfolio_id not in self.portfolios:
+            return False
+        self.put(portfolio_id, normalize_holdings(holdings))
+        return True
+
+    def get(self, portfolio_id):
+        entry = self.portfolios.get(portfolio_id)
+        if entry is None:
+            return None
+        entry['accessed'] = time.time()
+        return entry['holdings']
+
+    def delete(self, portfolio_id):
+        entry = self.portfolios.pop(portfolio_id, None)
+        if entry:
+            self._index(entry['holdings'], -1)
+        return entry is not None
+
+    def codes(self):
+        """所有组合持有的基金代码（去重）"""
+        return list(self.refcounts)
+
+    def expire(self):
+        """清理长期未访问的组合，返回被清理的 ID"""
+        expire_before = time.time() - self.idle_ttl
+        expired = [pid for pid, entry in self.portfolios.items() if entry['accessed'] < expire_before]
+        for pid in expired:
+            self.delete(pid)
+        return expired
+
+    def stats(self):
+        holdings = sum(len(entry['holdings']) for entry in self.portfolios.values())
+        return {
+            "portfolios": len(self.portfolios),
+            "holdings": holdings,
+            "distinctCodes": len(self.refcounts),
+            # 每轮刷新上游请求数相对“用户 × 持仓”的压缩比
+            "dedupRatio": round(holdings / len(self.refcounts), 2) if self.refcounts else 0.0,
+        }
@@ -0,0 +1,106 @@
+import time
+import asyncio
+
+
+class QuoteCache:
+    """进程内共享的行情缓存：按基金代码缓存，带 TTL，并合并同一代码的并发请求"""
+
+    def __init__(self, ttl=60.0, final_after=None):
+        self.ttl = ttl
+        # 可选回调，返回一个时间戳：在此之后写入的数据视为最终值（如收盘后），不受 TTL 限制
+        self.final_after = final_after
+        self._entries = {}    # code -> (写入时间戳, 数据)
+        self._inflight = {}   # code -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+
+    def peek(self, code):
+        """只读缓存，不触发抓取；过期或不存在时返回 None"""
+        entry = self._entries.get(code)
+        if not entry:
+            return None
+        if time.time() - entry[0] < self.ttl:
+            return entry[1]
+        final_after = self.final_after() if self.final_after else None
+        if final_after is not None and entry[0] >= final_after:
+            return entry[1]
+        return None
+
+    def last(self, code):
+        """最近一次写入的 (时间戳, 数据)，不检查 TTL，用于上游不可用时兜底"""
+        return self._entries.get(code)
+
+    def put(self, code, data, fetched_at=None):
+        self._entries[code] = (fetched_at or time.time(), data)
+
+    def merge(self, code, data, fetched_at):
+        """写入其他进程抓取的数据，仅当比本地缓存更新时覆盖，返回是否写入"""
+        entry = self._entries.get(code)
+        if entry and entry[0] >= fetched_at:
+            return False
+        self._entries[code] = (fetched_at, data)
+        return True
+
+    async def get(self, code, fetch):
+        """
+        获取基金行情
+        fetch: 无参数的可等待对象工厂，例如 lambda: get_fund_info_ths(code)
+        """
+        data = self.peek(code)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        # 已有相同代码正在抓取，直接等待同一结果
+        pending = self._inflight.get(code)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        return await self._fetch(code, fetch)
+
+    async def refresh(self, code, fetch):
+        """忽略 TTL 强制抓取并写入缓存（后台轮询使用），仍与正在进行的抓取合并"""
+        pending = self._inflight.get(code)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        self.refreshes += 1
+        return await self._fetch(code, fetch)
+
+    async def _fetch(self, code, fetch):
+        # 抓取放在独立任务中，发起者和合并进来的请求都只 shield 等待：
+        # 任何一个调用方被取消（如客户端断开）都不会中断抓取，也不会波及其他调用方
+        task = asyncio.create_task(self._run(code, fetch))
+        self._inflight[code] = task
+        task.add_done_callback(lambda t: self._done(code, t))
+        return await asyncio.shield(task)
+
+    async def _run(self, code, fetch):
+        data = await fetch()
+        if data is not None:
+            self.put(code, data)
+        return data
+
+    def _done(self, code, task):
+        if self._inflight.get(code) is task:
+            del self._inflight[code]
+        # 调用方都已取消时无人取结果，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "ttl": self.ttl,
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            # 命中率 = 未触发上游请求的比例
+            "hitRate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class SnapshotStore:
+    """
+    本地持久化快照 (SQLite)：最新估值（含昨日净值）、已学习的名称映射、服务端组合及轮询订阅
+    估值、名称和订阅先进入内存缓冲，由后台定期批量落盘，避免每次抓取都同步写磁盘；组合写入较少，直接落盘
+    多个 worker 进程共用同一文件时，各自按时间戳增量读取其他进程写入的数据
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        self._pending_quotes = {}
+        self._pending_names = {}
+        self._pending_subscriptions = {}
+        self._pending_accessed = {}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quotes ("
+                "code TEXT PRIMARY KEY, date TEXT, prev_jz REAL, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_fetched_at ON quotes (fetched_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY, code TEXT NOT NULL)")
+            # 旧版本的 names 表没有写入时间
+            if "learned_at" not in [row[1] for row in self._conn.execute("PRAGMA table_info(names)")]:
+                self._conn.execute("ALTER TABLE names ADD COLUMN learned_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_names_learned_at ON names (learned_at)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS portfolios (id TEXT PRIMARY KEY, holdings TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            if "accessed" not in [row[1] for row in self._conn.execute("PRAGMA table_info(portfolios)")]:
+                self._conn.execute("ALTER TABLE portfolios ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+                self._conn.execute("UPDATE portfolios SET accessed = updated")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS subscriptions (code TEXT PRIMARY KEY, touched_at REAL NOT NULL)")
+            self._conn.commit()
+
+    def save_quote(self, code, data, fetched_at=None):
+        self._pending_quotes[code] = (data, fetched_at or data.get('fetchedAt') or time.time())
+
+    def save_name(self, name, code):
+        self._pending_names[name] = code
+
+    def save_subscriptions(self, codes):
+        now = time.time()
+        for code in codes:
+            self._pending_subscriptions[code] = now
+
+    def touch_portfolio(self, portfolio_id):
+        """记录组合被访问，多 worker 时按各进程汇总的访问时间清理闲置组合"""
+        self._pending_accessed[portfolio_id] = time.time()
+
+    def save_portfolio(self, portfolio_id, holdings, updated=None):
+        updated = updated or time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO portfolios VALUES (?, ?, ?, ?)",
+                                   (portfolio_id, json.dumps(holdings, ensure_ascii=False), updated, updated))
+
+    def delete_portfolio(self, portfolio_id):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM portfolios WHERE id = ?", (portfolio_id,))
+
+    def load_quotes(self):
+        """返回 [(code, 数据, 抓取时间戳)]"""
+        return self.quotes_since(0)
+
+    def quotes_since(self, since):
+        """抓取时间晚于 since 的估值 [(code, 数据, 抓取时间戳)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT code, data, fetched_at FROM quotes WHERE fetched_at > ?", (since,)).fetchall()
+        return [(code, json.loads(data), fetched_at) for code, data, fetched_at in rows]
+
+    def get_quote(self, code):
+        """单支基金的 (数据, 抓取时间戳)，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT data, fetched_at FROM quotes WHERE code = ?", (code,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def load_names(self):
+        return self.names_since(-1)
+
+    def names_since(self, since):
+        with self._lock:
+            return self._conn.execute("SELECT name, code FROM names WHERE learned_at > ?", (since,)).fetchall()
+
+    def subscriptions_since(self, since):
+        """[(code, 最近订阅时间戳)]"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT code, touched_at FROM subscriptions WHERE touched_at > ?", (since,)).fetchall()
+
+    def load_portfolios(self):
+        """返回 [(id, 持仓, 更新时间戳)]"""
+        return self.portfolios_since(-1)
+
+    def portfolios_since(self, since):
+        """更新时间晚于 since 的组合 [(id, 持仓, 更新时间戳)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, holdings, updated FROM portfolios WHERE updated > ?", (since,)).fetchall()
+        return [(pid, json.loads(holdings), updated) for pid, holdings, updated in rows]
+
+    def portfolio_ids(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM portfolios")}
+
+    def load_portfolio(self, portfolio_id):
+        """单个组合的 (持仓, 更新时间戳)，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT holdings, updated FROM portfolios WHERE id = ?", (portfolio_id,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def expire_portfolios(self, before):
+        """删除最后访问早于 before 的组合，返回被删除的 ID"""
+        with self._lock:
+            with self._conn:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM portfolios WHERE accessed < ?", (before,))]
+                self._conn.executemany("DELETE FROM portfolios WHERE id = ?", [(pid,) for pid in expired])
+        return expired
+
+    def flush(self):
+        """将缓冲区写入磁盘，返回写入条数"""
+        quotes, self._pending_quotes = self._pending_quotes, {}
+        names, self._pending_names = self._pending_names, {}
+        subscriptions, self._pending_subscriptions = self._pending_subscriptions, {}
+        accessed, self._pending_accessed = self._pending_accessed, {}
+        if not quotes and not names and not subscriptions and not accessed:
+            return 0
+        rows = [
+            (code, data.get('gztime', '')[:10], data.get('prevJZ'), json.dumps(data, ensure_ascii=False), fetched_at)
+            for code, (data, fetched_at) in quotes.items()
+        ]
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                # 多进程同时写入时只保留最新抓取的估值
+                self._conn.executemany(
+                    "INSERT INTO quotes VALUES (?, ?, ?, ?, ?) ON CONFLICT(code) DO UPDATE SET "
+                    "date = excluded.date, prev_jz = excluded.prev_jz, data = excluded.data, fetched_at = excluded.fetched_at "
+                    "WHERE excluded.fetched_at > quotes.fetched_at", rows)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO names VALUES (?, ?, ?)", [(n, c, now) for n, c in names.items()])
+                self._conn.executemany(
+                    "INSERT INTO subscriptions VALUES (?, ?) ON CONFLICT(code) DO UPDATE SET "
+                    "touched_at = max(touched_at, excluded.touched_at)", subscriptions.items())
+                self._conn.executemany(
+                    "UPDATE portfolios SET accessed = max(accessed, ?) WHERE id = ?",
+                    [(t, pid) for pid, t in accessed.items()])
+        return len(rows) + len(names) + len(subscriptions) + len(accessed)
+
+    def prune_subscriptions(self, before):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM subscriptions WHERE touched_at < ?", (before,))
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,156 @@
+import time
+import asyncio
+from collections import deque
+
+import http_pool
+
+
+class SourceStats:
+    """单个数据源最近 window 次请求的耗时与成败"""
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)   # True 成功 / False 失败或数据可疑
+        self.requests = 0
+        self.wins = 0
+
+    def record(self, seconds, ok):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self):
+        """期望耗时：中位耗时按成功率放大，越小越好"""
+        p50 = self.percentile(50)
+        if p50 is None:
+            return None
+        return p50 / max(0.05, 1 - self.error_rate())
+
+    def to_dict(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "requests": self.requests,
+            "wins": self.wins,
+            "errorRate": round(self.error_rate(), 4),
+            "p50Ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95Ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class SourceRouter:
+    """
+    多数据源对冲请求：先请求期望耗时最低的主数据源，超过其 p95 仍未返回时再向备用源发一次，
+    取先到的有效结果。主数据源失败或返回可疑数据（如停更的 0.00%）时立即改问备用源
+    耗时只统计请求真正发往上游之后的部分（见 http_pool.RequestTrace），对冲计时也从请求发出时开始，
+    请求还在本地限速/并发名额上排队时不对冲
+    """
+
+    def __init__(self, sources, is_suspect=None, min_samples=20, hedge_default=1.0,
+                 hedge_min=0.05, hedge_max=3.0):
+        self.sources = sources                # {名称: async (code) -> 估值或 None}，按默认优先级排列
+        self.is_suspect = is_suspect or (lambda data: False)
+        self.min_samples = min_samples        # 样本不足时按默认优先级选主数据源
+        self.hedge_default = hedge_default    # 没有耗时统计时的对冲等待时间（秒）
+        self.hedge_min = hedge_min
+        self.hedge_max = hedge_max
+        self.stats = {name: SourceStats() for name in sources}
+        self.hedged = 0
+        self.fallbacks = 0
+        self._tasks = set()
+
+    def ranked(self):
+        """按期望耗时排序的数据源名称"""
+        names = list(self.sources)
+        if any(len(self.stats[n].outcomes) < self.min_samples for n in names):
+            return names
+        return sorted(names, key=lambda n: self.stats[n].score() or float("inf"))
+
+    def hedge_delay(self, name):
+        p95 = self.stats[name].percentile(95)
+        if p95 is None or len(self.stats[name].latencies) < self.min_samples:
+            return self.hedge_default
+        return min(self.hedge_max, max(self.hedge_min, p95))
+
+    async def _call(self, name, code, trace):
+        # 任务有独立的上下文副本，这里设置的 trace 只作用于本数据源的请求
+        http_pool.current_trace.set(trace)
+        started = time.perf_counter()
+        try:
+            data = await self.sources[name](code)
+        except Exception as e:
+            print(f"数据源 {name} 获取失败 ({code}): {e}")
+            data = None
+        # 没有发出上游请求（如熔断直接失败）时按总耗时计
+        seconds = trace.upstream if trace.requests else time.perf_counter() - started
+        # 可疑数据按失败计入，持续返回停更数据的数据源会被降级
+        self.stats[name].record(seconds, data is not None and not self.is_suspect(data))
+        return name, data
+
+    def _start(self, name, code):
+        trace = http_pool.RequestTrace()
+        task = asyncio.create_task(self._call(name, code, trace))
+        # 落选的请求继续跑完，耗时统计保持完整
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task, trace
+
+    async def fetch(self, code):
+        """返回 (数据源名称, 估值)，所有数据源都失败时返回 (None, None)"""
+        order = self.ranked()
+        name, alternates = order[0], order[1:]
+        task, trace = self._start(name, code)
+        pending = {task}
+        suspect = None
+        while pending:
+            waiter, timeout = None, None
+            if alternates:
+                if trace.sent_at is None:
+                    # 最近发起的请求还在本地排队，等它发出后再开始对冲计时
+                    waiter = asyncio.ensure_future(trace.sent.wait())
+                else:
+                    timeout = max(0.0, trace.sent_at + self.hedge_delay(name) - time.perf_counter())
+            done, _ = await asyncio.wait(pending | {waiter} if waiter is not None else pending,
+                                         timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if waiter is not None:
+                waiter.cancel()
+                done.discard(waiter)
+                if not done:
+                    continue
+            for task in done:
+                pending.discard(task)
+                name, data = task.result()
+                if data is None:
+                    continue
+                if not self.is_suspect(data):
+                    self.stats[name].wins += 1
+                    return name, data
+                suspect = suspect or (name, data)
+            if not alternates:
+                continue
+            # 主数据源超时、失败或数据可疑：追加备用源
+            if done:
+                self.fallbacks += 1
+            else:
+                self.hedged += 1
+            name = alternates.pop(0)
+            task, trace = self._start(name, code)
+            pending.add(task)
+        return suspect or (None, None)
+
+    def stats_dict(self):
+        return {
+            "order": self.ranked(),
+            "hedged": self.hedged,
+            "fallbacks": self.fallbacks,
+            "sources": {name: s.to_dict() for name, s in self.stats.items()},
+        }
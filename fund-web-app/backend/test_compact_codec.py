@@ -0,0 +1,51 @@
+"""compact_codec 编解码往返测试：python -m pytest test_compact_codec.py 或直接 python test_compact_codec.py"""
+import math
+
+import compact_codec
+
+
+def make_columns(rows):
+    columns = compact_codec.Columns()
+    for code, version, stale, *values in rows:
+        columns.append(code, version, stale, *values)
+        columns.names[code] = f"基金{code}"
+    return columns
+
+
+def test_roundtrip():
+    rows = [
+        ("000001", "1.2345@2026-10-17 15:00", False, 1.23, 12.5, -3.0, 1000.0, 4.2),
+        ("004253", "", True, 0.0, 0.0, 0.0, 500.0, None),
+        ("161725", "带中文\x1f及分隔符", False, -2.5, -25.0, 10.0, 1000.0, 0.0),
+    ]
+    columns = make_columns(rows)
+    decoded = compact_codec.decode_columns(compact_codec.encode_columns(columns, {"unchanged": 2}))
+    assert decoded == columns.to_dict({"unchanged": 2})
+    assert decoded["age"][1] is None
+
+
+def test_single_empty_version():
+    # 只有一行且 version 为空字符串时，解码结果仍与 codes 对齐
+    columns = make_columns([("000001", "", True, 0.0, 0.0, 0.0, 100.0, None)])
+    decoded = compact_codec.decode_columns(compact_codec.encode_columns(columns))
+    assert decoded["codes"] == ["000001"]
+    assert decoded["versions"] == [""]
+
+
+def test_empty():
+    decoded = compact_codec.decode_columns(compact_codec.encode_columns(compact_codec.Columns()))
+    assert decoded["codes"] == [] and decoded["versions"] == [] and decoded["names"] == {}
+    assert decoded["meta"] == {}
+
+
+def test_nan_values():
+    columns = make_columns([("000001", "v", False, math.nan, 1.0, 2.0, 3.0, 4.0)])
+    decoded = compact_codec.decode_columns(compact_codec.encode_columns(columns))
+    assert decoded["realtimeChange"] == [None]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} 通过")
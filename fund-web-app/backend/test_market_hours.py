@@ -0,0 +1,45 @@
+"""market_hours 可疑估值规则测试：python -m pytest test_market_hours.py 或直接 python test_market_hours.py"""
+import datetime
+
+import market_hours
+
+# 2026-10-16 为周五（交易日），2026-10-17 为周六
+FRIDAY = datetime.date(2026, 10, 16)
+
+
+def at(day, hour, minute):
+    return datetime.datetime.combine(day, datetime.time(hour, minute), tzinfo=market_hours.CN_TZ)
+
+
+def test_flat_estimates_today_are_not_stale():
+    now = at(FRIDAY, 9, 31)
+    # 开盘第一个点：估值等于昨日净值
+    assert not market_hours.estimate_is_stale(0.0, "2026-10-16 0930", now)
+    # 天天基金格式的平盘估值（如债券基金）
+    assert not market_hours.estimate_is_stale(0.0, "2026-10-16 09:31", now)
+    assert not market_hours.estimate_is_stale(0.12, "2026-10-16 0931", now)
+
+
+def test_previous_day_estimate_is_stale_after_open():
+    now = at(FRIDAY, 10, 0)
+    assert market_hours.estimate_is_stale(0.0, "2026-10-15 1500", now)
+    assert market_hours.estimate_is_stale(1.5, "2026-10-15 15:00", now)
+
+
+def test_empty_curve_is_stale():
+    # 同花顺当天没有任何分时点时 gztime 为 "日期 实时"，涨跌幅为 0
+    now = at(FRIDAY, 10, 0)
+    assert market_hours.estimate_is_stale(0.0, "2026-10-16 实时", now)
+    assert not market_hours.estimate_is_stale(0.3, "2026-10-16 实时", now)
+
+
+def test_before_open_and_non_trading_days_are_not_stale():
+    assert not market_hours.estimate_is_stale(0.0, "2026-10-15 1500", at(FRIDAY, 9, 0))
+    assert not market_hours.estimate_is_stale(0.0, "2026-10-16 1500", at(FRIDAY + datetime.timedelta(days=1), 10, 0))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} 通过")
@@ -0,0 +1,44 @@
+"""name_matcher 测试：python -m pytest test_name_matcher.py 或直接 python test_name_matcher.py"""
+import name_matcher
+from name_matcher import NameMatcher
+
+
+def test_longest_match():
+    m = NameMatcher()
+    m.add_many([("易方达蓝筹精选混合", "005827"), ("易方达蓝筹", "000001"), ("国泰黄金ETF联接C", "004253")])
+    assert m.longest_match("1. 易方达蓝筹精选混合 1000") == ("易方达蓝筹精选混合", "005827")
+    assert m.longest_match("易方达蓝筹 500") == ("易方达蓝筹", "000001")
+    assert m.longest_match("国泰 黄金ETF联接C：2000") == ("国泰黄金ETF联接C", "004253")
+    assert m.longest_match("招商中证白酒 300") is None
+
+
+def test_incremental_add_and_update():
+    m = NameMatcher()
+    m.add_many([(f"测试基金{i:04d}", f"{i:06d}") for i in range(1000)])
+    merges = m.merges
+    # 新名称进入增量自动机，不重建主自动机
+    m.add("黄金联接", "004253")
+    assert m.longest_match("黄金联接 100") == ("黄金联接", "004253")
+    assert m.merges == merges
+    # 已有名称改代码时原地更新
+    m.add("测试基金0007", "999999")
+    assert m.longest_match("测试基金0007 100") == ("测试基金0007", "999999")
+    # 增量部分与主自动机中的名称比较长度
+    m.add("测试基金0007增强", "888888")
+    assert m.longest_match("测试基金0007增强 100") == ("测试基金0007增强", "888888")
+
+
+def test_merge_threshold():
+    m = NameMatcher()
+    for i in range(name_matcher.MERGE_MIN + 1):
+        m.add(f"基金{i:03d}号", str(i))
+    assert m.merges == 1
+    assert m.longest_match("基金000号") == ("基金000号", "0")
+    assert m.longest_match(f"基金{name_matcher.MERGE_MIN:03d}号") == (f"基金{name_matcher.MERGE_MIN:03d}号", str(name_matcher.MERGE_MIN))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} 通过")
@@ -0,0 +1,145 @@
+import math
+import time
+import bisect
+from array import array
+from collections import Counter
+
+# 基金简称以管理人简称开头（如“易方达”“工银瑞信”），按名称前缀推断基金公司
+COMPANY_PREFIX_LENGTHS = (4, 3)
+# 更长的前缀需覆盖两字前缀下至少该比例的基金，才视为公司名的一部分
+COMPANY_PREFIX_SHARE = 0.9
+
+
+def infer_companies(names):
+    """按名称前缀推断基金公司，返回与 names 等长的列表"""
+    counts = Counter()
+    for name in names:
+        for length in (2,) + COMPANY_PREFIX_LENGTHS:
+            if len(name) > length:
+                counts[name[:length]] += 1
+    companies = []
+    for name in names:
+        base = counts[name[:2]]
+        company = name[:2]
+        for length in COMPANY_PREFIX_LENGTHS:
+            if len(name) > length and counts[name[:length]] >= COMPANY_PREFIX_SHARE * base:
+                company = name[:length]
+                break
+        companies.append(company)
+    return companies
+
+
+def category_keys(category):
+    """类型“混合型-偏股”同时归入“混合型-偏股”和“混合型”"""
+    if not category:
+        return ()
+    coarse = category.split("-")[0]
+    return (category, coarse) if coarse != category else (category,)
+
+
+class UniverseSnapshot:
+    """
+    全市场估值快照（列式存储），构建后只读；每次刷新整体重建再替换，读取方不会看到构建了一半的数据
+    涨跌幅索引为按涨跌幅降序排列的行号，类型、基金公司各自维护同样排好序的子索引，
+    top-N / bottom-N 直接切片，涨跌幅区间用二分查找
+    """
+
+    def __init__(self, codes=(), names=(), categories=(), companies=(), changes=(), gsz=(), gztimes=()):
+        self.codes = list(codes)
+        self.names = list(names)
+        self.categories = list(categories)
+        self.companies = list(companies)
+        self.change = array('d', changes)   # NaN 表示未取到估值
+        self.gsz = array('d', gsz)
+        self.gztime = list(gztimes)
+        self.row_of = {code: i for i, code in enumerate(self.codes)}
+        self.updated = time.time()
+        # 各索引为 (行号列表, 对应的负涨跌幅列表)，负值升序即涨跌幅降序，便于 bisect
+        priced = sorted((i for i, c in enumerate(self.change) if not math.isnan(c)), key=lambda i: -self.change[i])
+        self.by_change = self._index(priced)
+        by_category, by_company = {}, {}
+        for i in priced:
+            for key in category_keys(self.categories[i]):
+                by_category.setdefault(key, []).append(i)
+            by_company.setdefault(self.companies[i], []).append(i)
+        self.by_category = {k: self._index(rows) for k, rows in by_category.items()}
+        self.by_company = {k: self._index(rows) for k, rows in by_company.items()}
+        self._combined_cache = {}
+
+    def _index(self, rows):
+        return rows, [-self.change[i] for i in rows]
+
+    def _combined(self, category, company):
+        """类型与公司同时过滤的子索引，首次查询时由公司索引筛出后缓存（快照只读，缓存一直有效）"""
+        key = (category, company)
+        if key not in self._combined_cache:
+            rows = [i for i in self.by_company.get(company, ([], []))[0] if category in category_keys(self.categories[i])]
+            self._combined_cache[key] = self._index(rows)
+        return self._combined_cache[key]
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def priced(self):
+        return len(self.by_change[0])
+
+    def row(self, i):
+        return {
+            "code": self.codes[i],
+            "name": self.names[i],
+            "category": self.categories[i],
+            "company": self.companies[i],
+            "change": self.change[i],
+            "gsz": self.gsz[i],
+            "gztime": self.gztime[i],
+        }
+
+    def query(self, n=20, order="desc", category=None, company=None, min_change=None, max_change=None, offset=0):
+        """
+        按涨跌幅排序取前 n 条（order=asc 为跌幅最大的 n 条），可按类型、基金公司及涨跌幅区间过滤
+        返回 (匹配总数, 行列表)
+        """
+        if category is not None and company is not None:
+            rows, keys = self._combined(category, company)
+        elif category is not None:
+            rows, keys = self.by_category.get(category, ([], []))
+        elif company is not None:
+            rows, keys = self.by_company.get(company, ([], []))
+        else:
+            rows, keys = self.by_change
+        lo = 0 if max_change is None else bisect.bisect_left(keys, -max_change)
+        hi = len(rows) if min_change is None else bisect.bisect_right(keys, -min_change)
+        total = max(0, hi - lo)
+        if order == "asc":
+            start, stop = max(lo, hi - offset - n), hi - offset
+            picked = reversed(rows[start:max(start, stop)])
+        else:
+            picked = rows[lo + offset:min(hi, lo + offset + n)]
+        return total, [self.row(i) for i in picked]
+
+    def counts(self, index):
+        return {key: len(rows) for key, (rows, _) in sorted(index.items(), key=lambda kv: -len(kv[1][0]))}
+
+
+def build_snapshot(funds, last_quote):
+    """
+    funds: [(代码, 名称, 类型)]；last_quote: code -> 最近一次估值或 None
+    只读取缓存中已有的估值，不触发抓取
+    """
+    names = [name for _, name, _ in funds]
+    changes, gsz, gztimes = [], [], []
+    for code, _, _ in funds:
+        data = last_quote(code)
+        if data:
+            changes.append(round(data['gszzl'], 4))
+            gsz.append(data['currGSZ'])
+            gztimes.append(data.get('gztime', ''))
+        else:
+            changes.append(math.nan)
+            gsz.append(math.nan)
+            gztimes.append('')
+    return UniverseSnapshot(
+        [code for code, _, _ in funds], names, [category for _, _, category in funds],
+        infer_companies(names), changes, gsz, gztimes,
+    )
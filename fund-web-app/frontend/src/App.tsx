@@ -10,10 +10,14 @@ interface FundData {
   realtimeProfit: number;
   holdProfit: number;
   amount: number;
+  stale?: boolean;
+  age?: number | null;
 }
 
 // 获取 API 基础路径，优先使用环境变量，本地开发默认使用 8000 端口
 const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+// 刷新最多等待的毫秒数，超时的基金先显示缓存估值，服务端在后台继续更新
+const REFRESH_DEADLINE_MS = 1500;
 
 const App: React.FC = () => {
   const [inputText, setInputText] = useState('');
@@ -36,12 +40,40 @@ const App: React.FC = () => {
     localStorage.setItem('fund_holdings', JSON.stringify(data));
   }, [data]);
 
+  // 3. 持仓登记到服务端组合（首次创建，之后整体替换），返回服务端按共享行情计算的估值
+  const savePortfolio = async (holdings: FundData[]): Promise<FundData[]> => {
+    const id = localStorage.getItem('fund_portfolio_id');
+    if (id) {
+      try {
+        const res = await axios.put(`${API_BASE}/api/portfolios/${id}`, holdings);
+        return res.data.data;
+      } catch (err) {
+        // 服务端组合已失效时重新登记
+        if (!axios.isAxiosError(err) || err.response?.status !== 404) throw err;
+      }
+    }
+    const res = await axios.post(`${API_BASE}/api/portfolios`, holdings);
+    localStorage.setItem('fund_portfolio_id', res.data.id);
+    return res.data.data;
+  };
+
   const refreshAll = async (currentData: FundData[]) => {
     if (currentData.length === 0) return;
     setLoading(true);
     try {
-      const res = await axios.post(`${API_BASE}/api/refresh`, currentData);
-      setData(res.data.data);
+      const id = localStorage.getItem('fund_portfolio_id');
+      if (id) {
+        try {
+          const res = await axios.get(`${API_BASE}/api/portfolios/${id}`, {
+            params: { deadline_ms: REFRESH_DEADLINE_MS },
+          });
+          setData(res.data.data);
+          return;
+        } catch (err) {
+          if (!axios.isAxiosError(err) || err.response?.status !== 404) throw err;
+        }
+      }
+      setData(await savePortfolio(currentData));
     } catch (err) {
       toast.error('刷新实时数据失败');
     } finally {
@@ -57,20 +89,24 @@ const App: React.FC = () => {
       const newFunds = res.data.data;
       if (newFunds.length > 0) {
         // 合并新旧持仓，如果代码相同则更新
-        setData(prev => {
-          const updated = [...prev];
-          newFunds.forEach((nf: FundData) => {
-            const idx = updated.findIndex(f => f.code === nf.code);
-            if (idx > -1) {
-              updated[idx] = nf;
-            } else {
-              updated.push(nf);
-            }
-          });
-          return updated;
+        const updated = [...data];
+        newFunds.forEach((nf: FundData) => {
+          const idx = updated.findIndex(f => f.code === nf.code);
+          if (idx > -1) {
+            updated[idx] = nf;
+          } else {
+            updated.push(nf);
+          }
         });
+        setData(updated);
         toast.success(`识别成功！添加了 ${newFunds.length} 支基金`);
         setInputText('');
+        // 同步失败不影响已识别的持仓，本地数据保留，单独提示
+        try {
+          setData(await savePortfolio(updated));
+        } catch (err) {
+          toast.error('同步持仓失败');
+        }
       } else {
         toast.error('未识别到有效的基金名称或代码，请检查输入格式。');
       }
@@ -82,7 +118,9 @@ const App: React.FC = () => {
   };
 
   const handleDelete = (code: string) => {
-    setData(prev => prev.filter(f => f.code !== code));
+    const remaining = data.filter(f => f.code !== code);
+    setData(remaining);
+    savePortfolio(remaining).catch(() => toast.error('同步持仓失败'));
     toast.success('已删除');
   };
 
@@ -147,6 +185,11 @@ const App: React.FC = () => {
                         <div className="text-[10px] text-gray-500 mt-0.5 flex items-center gap-1">
                           <span className="bg-gray-100 px-1 rounded">{fund.code}</span>
                           <span className="text-gray-400 font-medium">¥{fund.amount.toFixed(0)}</span>
+                          {fund.stale && (
+                            <span className="text-amber-500" title={fund.age != null ? `${Math.round(fund.age)} 秒前的估值` : '估值未更新'}>
+                              延迟
+                            </span>
+                          )}
                         </div>
                       </td>
                       <td className="px-3 py-2 text-right">
@@ -186,7 +229,7 @@ const App: React.FC = () => {
       </main>
 
       <footer className="mt-auto py-6 text-gray-400 text-[10px]">
-        &copy; 2026 聪明养鸡 Web 版 | 本地存储，隐私安全
+        &copy; 2026 聪明养鸡 Web 版 | 持仓保存在本地及服务端组合
       </footer>
     </div>
   );
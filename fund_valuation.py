@@ -1,46 +1,47 @@
-import urllib.request
+import sys
+import csv
 import json
 import re
+import asyncio
+import argparse
 import datetime
 
-def get_fund_info(fund_code):
+import backend_path
+import http_pool
+from stock_quotes import fetch_stock_quotes, to_secid
+from holdings_store import HoldingsStore, refresh_holdings
+from intraday_store import parse_ths_chart
+
+async def get_fund_info(fund_code):
     """获取基金基础信息及昨日净值"""
     url = f"https://fundgz.1234567.com.cn/js/{fund_code}.js"
     try:
-        with urllib.request.urlopen(url) as response:
-            content = response.read().decode('utf-8')
-            # 匹配 jsonpgz({...});
-            match = re.search(r'jsonpgz\((.*)\);', content)
-            if match:
-                data = json.loads(match.group(1))
-                return data
+        content = await http_pool.get_text(url)
+        # 匹配 jsonpgz({...});
+        match = re.search(r'jsonpgz\((.*)\);', content)
+        if match:
+            data = json.loads(match.group(1))
+            return data
     except Exception as e:
         print(f"获取基金信息失败: {e}")
     return None
 
-def get_stock_changes(stock_list):
+async def get_stock_changes(stock_list):
     """获取股票实时涨跌幅"""
-    # stock_list 格式如: ['1.601899', '0.002460']
-    secids = ",".join(stock_list)
-    ut = "bd1d9ddb040897f350c061f0674230d7"
-    fields = "f12,f14,f2,f3,f4"
-    url = f"https://push2.eastmoney.com/api/qt/clist/get?pn=1&pz=20&po=1&np=1&ut={ut}&fltt=2&invt=2&fid=f3&fs=i:{secids.replace(',', ',i:')}&fields={fields}"
-    
+    # stock_list 格式如: ['1.601899', '0.002460']，也可直接传股票代码，数量不限
     try:
-        with urllib.request.urlopen(url) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            if data and data.get('data') and data['data'].get('diff'):
-                return data['data']['diff']
+        quotes = await fetch_stock_quotes(stock_list, fields="f12,f14,f2,f3,f4")
+        return list(quotes.values())
     except Exception as e:
         print(f"获取股票信息失败: {e}")
     return []
 
-def calculate_valuation(fund_code, holdings):
+async def calculate_valuation(fund_code, holdings):
     """
     计算基金估值
     holdings: [{'code': '601899', 'name': '紫金矿业', 'weight': 15.30}, ...]
     """
-    fund_info = get_fund_info(fund_code)
+    fund_info = await get_fund_info(fund_code)
     if not fund_info:
         return
     
@@ -48,14 +49,11 @@ def calculate_valuation(fund_code, holdings):
     prev_date = fund_info['jzrq']
     fund_name = fund_info['name']
     
-    stock_codes = []
-    for h in holdings:
-        # 东财代码前缀: 6开头为1.，0或3开头为0.
-        prefix = "1." if h['code'].startswith('6') else "0."
-        stock_codes.append(f"{prefix}{h['code']}")
+    stock_codes = [to_secid(h['code']) for h in holdings]
     
-    stock_data = get_stock_changes(stock_codes)
-    stock_map = {s['f12']: s for s in stock_data}
+    stock_data = await get_stock_changes(stock_codes)
+    # 按 secid 对应，同一代码在不同市场（如 A 股与港股）不会混淆，后缀/前缀写法的代码也能查到
+    stock_map = {f"{s.get('f13')}.{s.get('f12')}": s for s in stock_data}
     
     print(f"\n--- {fund_name} ({fund_code}) 实时估值计算 ---")
     print(f"基准日期: {prev_date}  单位净值: {prev_jz}")
@@ -66,9 +64,8 @@ def calculate_valuation(fund_code, holdings):
     weighted_change_sum = 0
     
     for h in holdings:
-        code = h['code']
         weight = h['weight']
-        s_info = stock_map.get(code)
+        s_info = stock_map.get(to_secid(h['code']))
         
         if s_info:
             change = s_info['f3'] # 涨跌幅
@@ -95,7 +92,7 @@ def calculate_valuation(fund_code, holdings):
         print(f"官方估算涨跌: {fund_info['gszzl']}% (参考)")
         print(f"估值时间: {fund_info['gztime']}")
 
-def get_fund_info_ths(fund_code):
+async def get_fund_info_ths(fund_code):
     """从同花顺获取基金实时估值"""
     url = f"https://gz-fund.10jqka.com.cn/?module=api&controller=index&action=chart&info=vm_fd_{fund_code}&start=0930"
     headers = {
@@ -103,45 +100,54 @@ def get_fund_info_ths(fund_code):
         'Referer': 'https://fund.10jqka.com.cn/'
     }
     try:
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=10) as response:
-            content = response.read().decode('utf-8')
-            # 解析格式: vm_fd_163406='...|2026-01-30~2.2511~0930,数据点...'
-            if '|' in content and '~' in content:
-                main_part = content.split('|')[1]
-                header = main_part.split(',')[0] # 2026-01-30~2.2511~0930
-                parts = header.split('~')
-                
-                # 获取最后一个数据点作为实时估值
-                data_points = content.split(',')
-                last_point = data_points[-1].strip("'").split(';')[-1] # 1500,2.28318,2.2511,0.000
-                last_val = last_point.split(',')[1] if ',' in last_point else parts[1]
-                
-                prev_jz = float(parts[1])
-                curr_gsz = float(last_val)
-                gszzl = ((curr_gsz - prev_jz) / prev_jz) * 100
-                
-                return {
-                    'fundcode': fund_code,
-                    'name': f"基金{fund_code}(同花顺)",
-                    'dwjz': str(prev_jz),
-                    'gsz': str(round(curr_gsz, 4)),
-                    'gszzl': str(round(gszzl, 2)),
-                    'gztime': parts[0] + " " + (last_point.split(',')[0] if ',' in last_point else "实时")
-                }
+        content = await http_pool.get_text(url, headers=headers, timeout=10)
+        # 解析格式: vm_fd_163406='...|2026-01-30~2.2511~0930,数据点...'，与后端共用解析
+        parsed = parse_ths_chart(content)
+        if parsed:
+            date, prev_jz, points = parsed
+            last_time, curr_gsz = (f"{points[-1][0]:04d}", points[-1][1]) if points else ("实时", prev_jz)
+            gszzl = ((curr_gsz - prev_jz) / prev_jz) * 100
+
+            return {
+                'fundcode': fund_code,
+                'name': f"基金{fund_code}(同花顺)",
+                'dwjz': str(prev_jz),
+                'gsz': str(round(curr_gsz, 4)),
+                'gszzl': str(round(gszzl, 2)),
+                'gztime': f"{date} {last_time}"
+            }
     except Exception as e:
         print(f"获取同花顺数据失败 ({fund_code}): {e}")
     return None
 
-def get_fund_valuation_only(fund_codes, source="ths"):
+SOURCES = ("ths", "eastmoney")
+DEFAULT_CONCURRENCY = 16
+
+
+def fetch_info(code, source):
+    """按数据源获取实时估值：ths 同花顺分时，eastmoney 天天基金估值"""
+    return get_fund_info_ths(code) if source == "ths" else get_fund_info(code)
+
+
+async def fetch_infos(codes, source, concurrency=DEFAULT_CONCURRENCY):
+    """有上限地并发获取多支基金估值，结果与 codes 顺序一致"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(code):
+        async with semaphore:
+            return await fetch_info(code, source)
+
+    return await asyncio.gather(*(one(code) for code in codes))
+
+
+async def get_fund_valuation_only(fund_codes, source="ths"):
     """仅获取基金实时估值"""
     print(f"\n--- 基金实时估值汇总 ({source.upper()}数据源, {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ---")
     print(f"{'代码':<10} {'基金名称':<25} {'估值':<10} {'涨跌幅':<10} {'时间':<10}")
     print("-" * 80)
     
     results = []
-    for code in fund_codes:
-        info = get_fund_info_ths(code) if source == "ths" else get_fund_info(code)
+    for code, info in zip(fund_codes, await fetch_infos(fund_codes, source)):
         if info:
             name = info['name']
             gsz = info['gsz']
@@ -156,7 +162,7 @@ def get_fund_valuation_only(fund_codes, source="ths"):
         f.write("\n".join(results))
     print(f"\n结果已保存至: 基金估值结果.txt")
 
-def calculate_holdings_and_profit(image_data, source="ths"):
+async def calculate_holdings_and_profit(image_data, source="ths"):
     """
     根据图片数据计算持有份额、实时涨跌幅、实时盈亏
     image_data: [{'name': '...', 'amount': 1649.77, 'code': '002610'}, ...]
@@ -173,8 +179,8 @@ def calculate_holdings_and_profit(image_data, source="ths"):
     total_realtime_profit = 0
     total_last_amount = 0
     
-    for item in image_data:
-        info = get_fund_info_ths(item['code']) if source == "ths" else get_fund_info(item['code'])
+    infos = await fetch_infos([item['code'] for item in image_data], source)
+    for item, info in zip(image_data, infos):
         if info:
             prev_jz = float(info['dwjz'])      # 上一交易日净值
             curr_gsz = float(info['gsz'])      # 实时估算净值
@@ -225,7 +231,170 @@ def calculate_holdings_and_profit(image_data, source="ths"):
         f.write("\n".join(file_results))
     print(f"\n规范化结果已覆盖写入: 基金估值结果.txt")
 
-if __name__ == "__main__":
+# 输入文件列名，中英文均可
+INPUT_COLUMNS = {
+    'code': ('code', '代码', '基金代码', '基金编号'),
+    'name': ('name', '名称', '基金名称'),
+    'amount': ('amount', '金额', '持仓金额'),
+    'hold_profit': ('hold_profit', '持有收益'),
+}
+OUTPUT_FIELDS = ['code', 'name', 'amount', 'gsz', 'gszzl', 'realtime_profit', 'hold_profit', 'gztime']
+
+
+def parse_holdings(text):
+    """
+    解析持仓输入：JSON 数组，或带表头的 CSV（没有表头时按 代码,金额 解析）
+    返回 [{'code', 'name', 'amount', 'hold_profit'}]，amount / hold_profit 可为 None
+    """
+    text = text.strip()
+    if text.startswith('['):
+        rows = json.loads(text)
+    else:
+        lines = [line for line in text.splitlines() if line.strip()]
+        if lines and re.match(r'^\s*\d{6}\b', lines[0]):
+            # 无表头：每行 "代码 金额"，逗号或空白分隔
+            rows = [dict(zip(('code', 'amount'), re.split(r'[,\s]+', line.strip()))) for line in lines]
+        else:
+            rows = list(csv.DictReader(lines))
+
+    def pick(row, key):
+        for column in INPUT_COLUMNS[key]:
+            value = row.get(column)
+            if value not in (None, ''):
+                return value
+        return None
+
+    holdings = []
+    for row in rows:
+        code = str(pick(row, 'code') or '').strip()
+        if not code:
+            continue
+        amount = pick(row, 'amount')
+        hold_profit = pick(row, 'hold_profit')
+        holdings.append({
+            'code': code.zfill(6),
+            'name': pick(row, 'name'),
+            'amount': float(amount) if amount is not None else None,
+            'hold_profit': float(hold_profit) if hold_profit is not None else None,
+        })
+    return holdings
+
+
+class ResultWriter:
+    """逐行写出结果：.json 写为 JSON 数组（结束时补上右括号），其他扩展名写 CSV"""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.json = path.lower().endswith(".json")
+        self.count = 0
+        if self.json:
+            self.file.write("[")
+        else:
+            self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_FIELDS)
+            self.writer.writeheader()
+        self.file.flush()
+
+    def write(self, row):
+        if self.json:
+            self.file.write(("," if self.count else "") + "\n" + json.dumps(row, ensure_ascii=False))
+        else:
+            self.writer.writerow(row)
+        self.count += 1
+        self.file.flush()
+
+    def close(self):
+        if self.json:
+            self.file.write("\n]\n")
+        self.file.close()
+
+
+def valuation_row(item, info):
+    """由持仓项和估值信息计算一行结果；未提供持仓金额时只给出估值"""
+    row = {'code': item['code'], 'name': item['name'], 'amount': item['amount'], 'gsz': None, 'gszzl': None,
+           'realtime_profit': None, 'hold_profit': item['hold_profit'], 'gztime': None}
+    if info:
+        prev_jz = float(info['dwjz'])
+        curr_gsz = float(info['gsz'])
+        row.update(name=item['name'] or info['name'], gsz=curr_gsz, gszzl=float(info['gszzl']), gztime=info['gztime'])
+        if item['amount'] is not None and prev_jz:
+            row['realtime_profit'] = round(item['amount'] / prev_jz * (curr_gsz - prev_jz), 2)
+    return row
+
+
+async def run_batch(holdings, source="ths", concurrency=DEFAULT_CONCURRENCY, output=None):
+    """
+    批量估值：有上限地并发请求，每支基金一返回就打印并写入输出文件
+    返回汇总 {'count', 'failed', 'realtime_profit', 'amount'}
+    """
+    print(f"\n--- 基金批量实时估值 ({source.upper()}数据源, {len(holdings)} 支, "
+          f"并发 {concurrency}, {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ---")
+    line_format = "{:<22} {:<10} {:>10} {:>10} {:>10} {:>10} {:<16}"
+    print(line_format.format("基金名称", "基金编号", "估值", "实时涨幅", "实时收益", "持仓金额", "时间"))
+    print("-" * 100)
+
+    writer = ResultWriter(output) if output else None
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = {'count': 0, 'failed': 0, 'realtime_profit': 0.0, 'amount': 0.0}
+
+    async def one(item):
+        async with semaphore:
+            return item, await fetch_info(item['code'], source)
+
+    try:
+        for future in asyncio.as_completed([one(item) for item in holdings]):
+            item, info = await future
+            row = valuation_row(item, info)
+            summary['count'] += 1
+            if row['gsz'] is None:
+                summary['failed'] += 1
+                print(line_format.format(row['name'] or '-', row['code'], '获取失败', '', '', '', ''))
+            else:
+                summary['realtime_profit'] += row['realtime_profit'] or 0.0
+                summary['amount'] += row['amount'] or 0.0
+                print(line_format.format(
+                    row['name'], row['code'], f"{row['gsz']:.4f}", f"{row['gszzl']:>+7.2f}%",
+                    f"{row['realtime_profit']:>+8.2f}" if row['realtime_profit'] is not None else '-',
+                    f"{row['amount']:.2f}" if row['amount'] is not None else '-', row['gztime']))
+            if writer:
+                writer.write(row)
+    finally:
+        if writer:
+            writer.close()
+
+    print("-" * 100)
+    print(f"共 {summary['count']} 支, 失败 {summary['failed']} 支 | 当日合计实时收益预估: "
+          f"{summary['realtime_profit']:>+10.2f} 元 | 总持仓金额: {summary['amount']:>10.2f} 元")
+    if output:
+        print(f"结果已写入: {output}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="基金实时估值。不带输入文件时运行内置示例；输入为 CSV（表头 code,name,amount,hold_profit）"
+                    "或 JSON 数组，'-' 表示从标准输入读取")
+    parser.add_argument("input", nargs="?", help="持仓文件 (.csv / .json)，'-' 为标准输入")
+    parser.add_argument("-o", "--output", help="结果输出文件，.json 输出 JSON，其他输出 CSV")
+    parser.add_argument("--source", choices=SOURCES, default="ths", help="估值数据源 (默认 ths)")
+    parser.add_argument("-j", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"最大并发请求数 (默认 {DEFAULT_CONCURRENCY})")
+    return parser.parse_args(argv)
+
+
+async def batch_main(args):
+    if args.input == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.input, encoding="utf-8-sig") as f:
+            text = f.read()
+    holdings = parse_holdings(text)
+    try:
+        await run_batch(holdings, args.source, max(1, args.concurrency), args.output)
+    finally:
+        await http_pool.aclose()
+
+
+async def main():
     # 解析图片数据 (增加持有收益字段以符合输出规范)
     image_holdings = [
         {'name': '博时黄金ETF联接A', 'amount': 1649.77, 'code': '002610', 'hold_profit': 255.22},
@@ -236,7 +405,7 @@ if __name__ == "__main__":
         {'name': '华夏有色金属ETF联接D', 'amount': 2373.1, 'code': '021534', 'hold_profit': 215.34} # 华夏数据根据图表估算
     ]
     
-    calculate_holdings_and_profit(image_holdings, source="ths")
+    await calculate_holdings_and_profit(image_holdings, source="ths")
 
     # 之前的成分股估值计算示例
     holdings_021534 = [
@@ -251,4 +420,13 @@ if __name__ == "__main__":
         {'code': '600489', 'name': '中金黄金', 'weight': 3.08},
         {'code': '002466', 'name': '天齐锂业', 'weight': 2.60},
     ]
-    calculate_valuation("021534", holdings_021534)
+    # 优先使用本地持仓库中的最新披露，取不到时退回手工录入的列表
+    store = HoldingsStore()
+    await refresh_holdings(store, ["021534"])
+    await calculate_valuation("021534", store.holdings("021534") or holdings_021534)
+    store.close()
+    await http_pool.aclose()
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(batch_main(args) if args.input else main())
@@ -0,0 +1,226 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import datetime
+
+import backend_path
+import http_pool
+from fund_directory import fetch_fund_universe
+
+HOLDINGS_DB = os.environ.get("HOLDINGS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "holdings.db"))
+# 天天基金 F10 持仓明细；季报只披露前十大，半年报/年报披露全部持仓，topline 取大值即可拿到全部
+JJCC_URL = "https://fundf10.eastmoney.com/FundArchivesDatas.aspx?type=jjcc&code={code}&topline={topline}&year=&month="
+FULL_TOPLINE = 500
+# 季报在季度结束后 15 个工作日内披露，按 22 个自然日估算；半年报 8 月底、年报次年 3 月底披露全部持仓
+QUARTER_REPORT_LAG = datetime.timedelta(days=22)
+# 披露期已到但接口仍是旧数据时，至少间隔这么久再重试
+RECHECK_INTERVAL = 24 * 3600
+
+PERIOD_RE = re.compile(r'(\d{4})年(\d)季度')
+ROW_RE = re.compile(r'<tr>(.*?)</tr>', re.S)
+CELL_RE = re.compile(r'<td[^>]*>(.*?)</td>', re.S)
+TAG_RE = re.compile(r'<[^>]+>')
+WEIGHT_RE = re.compile(r'(\d+(?:\.\d+)?)%')
+
+
+def quarter_end(year, quarter):
+    month = quarter * 3
+    next_month = datetime.date(year + (month == 12), month % 12 + 1, 1)
+    return next_month - datetime.timedelta(days=1)
+
+
+def expected_period(today=None):
+    """
+    按披露时间推算当前应能拿到的最新报告期
+    返回 (报告期, 是否应为全部持仓)，报告期格式 '2025Q3'
+    """
+    today = today or datetime.date.today()
+    year, quarter = today.year, (today.month - 1) // 3 + 1
+    # 从上一个季度往前找第一个已过披露期的季度
+    for _ in range(4):
+        quarter -= 1
+        if quarter == 0:
+            year, quarter = year - 1, 4
+        if today >= quarter_end(year, quarter) + QUARTER_REPORT_LAG:
+            break
+    full = False
+    if quarter == 2:
+        full = today >= datetime.date(year, 8, 31)
+    elif quarter == 4:
+        full = today >= datetime.date(year + 1, 3, 31)
+    return f"{year}Q{quarter}", full
+
+
+def parse_jjcc(content):
+    """
+    解析 F10 持仓明细页面，只取最新一个报告期
+    返回 (报告期, [{'code', 'name', 'weight'}])，无持仓数据时返回 (None, [])
+    """
+    match = re.search(r'content:"(.*?)",\s*arryear', content, re.S)
+    html = match.group(1) if match else content
+    period_match = PERIOD_RE.search(html)
+    if not period_match:
+        return None, []
+    period = f"{period_match.group(1)}Q{period_match.group(2)}"
+    # 只解析第一个报告期的表格
+    section = html[period_match.end():]
+    next_period = PERIOD_RE.search(section)
+    if next_period:
+        section = section[:next_period.start()]
+
+    rows = []
+    for row in ROW_RE.findall(section):
+        cells = [TAG_RE.sub('', c).strip() for c in CELL_RE.findall(row)]
+        if len(cells) < 3 or not re.fullmatch(r'[0-9A-Z]{4,6}', cells[1]):
+            continue
+        weight = next((float(m.group(1)) for c in cells[3:] if (m := WEIGHT_RE.fullmatch(c))), None)
+        if weight is not None:
+            rows.append({'code': cells[1], 'name': cells[2], 'weight': weight})
+    return period, rows
+
+
+class HoldingsStore:
+    """
+    本地基金持仓库 (SQLite)：按基金、按股票双向索引，只保存每支基金最新一个报告期
+    """
+
+    def __init__(self, path=HOLDINGS_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS holdings ("
+            "fund_code TEXT NOT NULL, stock_code TEXT NOT NULL, stock_name TEXT, weight REAL NOT NULL, "
+            "PRIMARY KEY (fund_code, stock_code)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_holdings_stock ON holdings (stock_code, weight)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS periods ("
+            "fund_code TEXT PRIMARY KEY, period TEXT, full INTEGER, checked_at REAL)"
+        )
+        self.conn.commit()
+
+    def holdings(self, fund_code):
+        rows = self.conn.execute(
+            "SELECT stock_code, stock_name, weight FROM holdings WHERE fund_code = ? ORDER BY weight DESC",
+            (fund_code,)).fetchall()
+        return [{'code': code, 'name': name, 'weight': weight} for code, name, weight in rows]
+
+    def all_holdings(self, fund_codes=None):
+        """{基金代码: 持仓列表}，可直接用于 valuation_engine.HoldingsMatrix"""
+        sql = "SELECT fund_code, stock_code, stock_name, weight FROM holdings"
+        params = ()
+        if fund_codes is not None:
+            fund_codes = list(fund_codes)
+            sql += f" WHERE fund_code IN ({','.join('?' * len(fund_codes))})"
+            params = fund_codes
+        result = {}
+        for fund_code, code, name, weight in self.conn.execute(sql + " ORDER BY fund_code, weight DESC", params):
+            result.setdefault(fund_code, []).append({'code': code, 'name': name, 'weight': weight})
+        return result
+
+    def funds_holding(self, stock_code):
+        """反向索引：持有该股票的基金 [(基金代码, 权重)]，按权重降序"""
+        return self.conn.execute(
+            "SELECT fund_code, weight FROM holdings WHERE stock_code = ? ORDER BY weight DESC",
+            (stock_code,)).fetchall()
+
+    def period_of(self, fund_code):
+        return self.conn.execute(
+            "SELECT period, full, checked_at FROM periods WHERE fund_code = ?", (fund_code,)).fetchone()
+
+    def needs_refresh(self, fund_code, today=None):
+        """新的报告期（或半年报/年报的全部持仓）应已披露而本地还没有时返回 True"""
+        stored = self.period_of(fund_code)
+        if stored is None:
+            return True
+        period, full, checked_at = stored
+        want_period, want_full = expected_period(today)
+        stale = (period or "") < want_period or (period == want_period and want_full and not full)
+        return stale and time.time() - (checked_at or 0) >= RECHECK_INTERVAL
+
+    def replace(self, fund_code, period, rows):
+        with self.conn:
+            self.conn.execute("DELETE FROM holdings WHERE fund_code = ?", (fund_code,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO holdings VALUES (?, ?, ?, ?)",
+                [(fund_code, r['code'], r['name'], r['weight']) for r in rows])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO periods VALUES (?, ?, ?, ?)",
+                (fund_code, period, int(len(rows) > 10), time.time()))
+
+    def mark_checked(self, fund_code):
+        with self.conn:
+            self.conn.execute("UPDATE periods SET checked_at = ? WHERE fund_code = ?", (time.time(), fund_code))
+            self.conn.execute(
+                "INSERT OR IGNORE INTO periods VALUES (?, NULL, 0, ?)", (fund_code, time.time()))
+
+    def close(self):
+        self.conn.close()
+
+
+async def fetch_holdings(fund_code):
+    content = await http_pool.get_text(JJCC_URL.format(code=fund_code, topline=FULL_TOPLINE), timeout=15)
+    return parse_jjcc(content)
+
+
+async def refresh_holdings(store, fund_codes, force=False):
+    """只为出现新报告期的基金重新下载持仓，返回实际更新的基金数"""
+    todo = [code for code in dict.fromkeys(fund_codes) if force or store.needs_refresh(code)]
+    results = await asyncio.gather(*(fetch_holdings(code) for code in todo), return_exceptions=True)
+    updated = 0
+    for code, result in zip(todo, results):
+        if isinstance(result, Exception):
+            print(f"获取持仓失败 ({code}): {result}")
+            continue
+        period, rows = result
+        stored = store.period_of(code)
+        # 新报告期，或同一报告期从前十大补全为全部持仓
+        if period and rows and (stored is None or stored[0] != period or (len(rows) > 10 and not stored[1])):
+            store.replace(code, period, rows)
+            updated += 1
+        else:
+            store.mark_checked(code)
+    return updated
+
+
+async def main():
+    """
+    用法:
+        python holdings_store.py 021534 015968 ...    下载/更新这些基金的持仓并打印
+        python holdings_store.py --all                 下载/更新全市场基金的持仓
+        python holdings_store.py --stock 601899        查询持有该股票的基金
+    """
+    args = sys.argv[1:]
+    if not args:
+        print(main.__doc__)
+        return
+    store = HoldingsStore()
+    if args[0] == "--stock":
+        for stock_code in args[1:]:
+            funds = store.funds_holding(stock_code)
+            print(f"\n持有 {stock_code} 的基金 ({len(funds)} 支):")
+            for fund_code, weight in funds:
+                print(f"{fund_code:<10} {weight:>6.2f}%")
+    elif args[0] == "--all":
+        funds = [row[0] for row in await fetch_fund_universe()]
+        updated = await refresh_holdings(store, funds)
+        await http_pool.aclose()
+        print(f"全市场 {len(funds)} 支基金, 已更新 {updated} 支的持仓")
+    else:
+        updated = await refresh_holdings(store, args)
+        await http_pool.aclose()
+        print(f"已更新 {updated} 支基金的持仓")
+        for fund_code in args:
+            stored = store.period_of(fund_code)
+            print(f"\n--- {fund_code} 持仓 ({stored[0] if stored else '无数据'}) ---")
+            print(json.dumps(store.holdings(fund_code), ensure_ascii=False))
+    store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import re
+import asyncio
+
+import backend_path
+import http_pool
+
+CLIST_URL = "https://push2.eastmoney.com/api/qt/clist/get"
+UT = "bd1d9ddb040897f350c061f0674230d7"
+# f13 为市场编号，用于把返回行对应回 secid
+DEFAULT_FIELDS = "f12,f13,f14,f2,f3,f4,f5,f6"
+
+# 每个请求携带的 secid 数，控制 URL 长度（约 12 字节/个）
+CHUNK_SIZE = 100
+# 每页行数，与 CHUNK_SIZE 相同时一个分片通常一次请求即可取完
+PAGE_SIZE = 100
+
+# 东财市场编号
+MARKET_SH = "1"
+MARKET_SZ = "0"      # 深市及北交所
+MARKET_HK = "116"
+MARKET_US = {"O": "105", "N": "106", "A": "107"}   # 纳斯达克 / 纽交所 / 美交所
+SUFFIX_MARKETS = {"SH": MARKET_SH, "SS": MARKET_SH, "SZ": MARKET_SZ, "BJ": MARKET_SZ, "HK": MARKET_HK, **MARKET_US}
+
+# 已是 secid 时的市场编号：除上面几个外，2 为中证指数、90 为板块、100 为全球指数、124/128 为港股指数及其他港股
+SECID_MARKETS = {MARKET_SH, MARKET_SZ, MARKET_HK, *MARKET_US.values(), "2", "90", "100", "124", "128"}
+SECID_RE = re.compile(r'^(\d{1,3})\.([0-9A-Za-z_.\-]+)$')
+
+
+def to_secid(code):
+    """
+    将股票代码转换为东财 secid（市场编号.代码）
+    支持: '600519' / '600519.SH' / 'sh600519' / '1.600519' / '00700' / '0700.HK' / 'AAPL.O' / 'AAPL'
+    """
+    code = code.strip()
+    upper = code.upper()
+    # 后缀形式: 600519.SH, 0700.HK, 700.HK, AAPL.O；先于 secid 判断，避免 700.HK 被当成市场编号 700
+    if "." in upper:
+        symbol, suffix = upper.rsplit(".", 1)
+        market = SUFFIX_MARKETS.get(suffix)
+        if market == MARKET_HK:
+            return f"{market}.{symbol.zfill(5)}"
+        if market:
+            return f"{market}.{symbol}"
+    match = SECID_RE.match(code)
+    if match and match.group(1) in SECID_MARKETS:
+        return code
+    # 前缀形式: sh600519, sz000001, bj830799, hk00700
+    prefix = upper[:2]
+    if prefix in ("SH", "SZ", "BJ", "HK") and upper[2:].isdigit():
+        return to_secid(f"{upper[2:]}.{prefix}")
+    if upper.isdigit():
+        if len(upper) == 5:
+            return f"{MARKET_HK}.{upper}"
+        if len(upper) == 6:
+            # 北交所新代码段 920 与深市同为 0.
+            if upper.startswith("920"):
+                return f"{MARKET_SZ}.{upper}"
+            # 沪市: 6 主板/科创板、9 B 股、5 基金/ETF、11 可转债；其余（深市 0/1/2/3、北交所 4/8）为 0.
+            if upper[0] in "569" or upper.startswith("11"):
+                return f"{MARKET_SH}.{upper}"
+            return f"{MARKET_SZ}.{upper}"
+    if upper.isalpha():
+        # 无交易所后缀的美股默认按纳斯达克处理
+        return f"{MARKET_US['O']}.{upper}"
+    return f"{MARKET_SZ}.{upper}"
+
+
+async def _fetch_page(secids, page, fields):
+    fs = ",".join(f"i:{s}" for s in secids)
+    url = (f"{CLIST_URL}?pn={page}&pz={PAGE_SIZE}&po=1&np=1&ut={UT}&fltt=2&invt=2&fid=f3"
+           f"&fs={fs}&fields={fields}")
+    data = await http_pool.get_json(url)
+    if data and data.get('data'):
+        return data['data'].get('total', 0), data['data'].get('diff') or []
+    return 0, []
+
+
+async def _fetch_chunk(secids, fields):
+    """取一个分片；若服务端单页返回不全则并发补取剩余页"""
+    total, rows = await _fetch_page(secids, 1, fields)
+    if total > len(rows) and rows:
+        pages = range(2, -(-total // len(rows)) + 1)
+        for _total, more in await asyncio.gather(*(_fetch_page(secids, p, fields) for p in pages)):
+            rows.extend(more)
+    return rows
+
+
+async def fetch_stock_quotes(codes, fields=DEFAULT_FIELDS):
+    """
+    批量获取股票行情：代码去重并转换 secid 后分片，所有分片并发请求
+    返回 {secid: 行情行}，行情行字段同 clist 接口 (f2 最新价, f3 涨跌幅, f12 代码, f14 名称 ...)
+    """
+    wanted = fields.split(",")
+    fields = ",".join(dict.fromkeys(["f12", "f13"] + wanted))
+    secids = list(dict.fromkeys(to_secid(c) for c in codes))
+    chunks = [secids[i:i + CHUNK_SIZE] for i in range(0, len(secids), CHUNK_SIZE)]
+    results = await asyncio.gather(*(_fetch_chunk(chunk, fields) for chunk in chunks), return_exceptions=True)
+    quotes = {}
+    for chunk, rows in zip(chunks, results):
+        if isinstance(rows, Exception):
+            print(f"获取股票行情失败 ({len(chunk)} 支): {rows}")
+            continue
+        for row in rows:
+            quotes[f"{row.get('f13')}.{row.get('f12')}"] = row
+    return quotes
@@ -0,0 +1,97 @@
+import json
+import asyncio
+
+import backend_path
+import http_pool
+from stock_quotes import UT, to_secid
+
+# 东财 push2 推送行情 (text/event-stream)：连接后先推一次全量，之后只推有变化的字段
+ULIST_SSE_URL = "https://push2.eastmoney.com/api/qt/ulist/sse"
+STREAM_FIELDS = "f12,f13,f14,f2,f3,f4"
+# 每条连接订阅的 secid 数，控制 URL 长度；超过时分多条连接
+STREAM_CHUNK_SIZE = 200
+# 超过该秒数没有任何推送（含心跳）视为断线
+STREAM_READ_TIMEOUT = 60.0
+RECONNECT_MAX = 30.0
+
+
+class QuoteTable:
+    """
+    实时行情表 {secid: {字段: 值}}
+    增量推送中的行以位置编号标识且不带代码，按本连接首包（全量）建立 位置→secid 的对应
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.ticks = 0
+
+    def apply(self, payload, positions):
+        """合并一条推送，返回 {secid: 变化的字段}；positions 为该连接的 位置→secid"""
+        diff = (payload.get('data') or {}).get('diff')
+        if isinstance(diff, list):
+            items = enumerate(diff)
+        elif isinstance(diff, dict):
+            items = diff.items()
+        else:
+            return {}
+        changed = {}
+        for pos, fields in items:
+            pos = int(pos)
+            if 'f12' in fields and 'f13' in fields:
+                positions[pos] = f"{fields['f13']}.{fields['f12']}"
+            secid = positions.get(pos)
+            if secid is None:
+                continue
+            row = self.rows.setdefault(secid, {})
+            # fltt=2 时停牌等无数据的字段为 "-"
+            delta = {k: v for k, v in fields.items() if v != "-" and row.get(k) != v}
+            if delta:
+                row.update(delta)
+                changed[secid] = delta
+        if changed:
+            self.ticks += 1
+        return changed
+
+    def change(self, secid):
+        value = self.rows.get(secid, {}).get('f3')
+        return value if isinstance(value, (int, float)) else None
+
+
+async def _stream_chunk(secids, table, on_tick, fields):
+    url = (f"{ULIST_SSE_URL}?fltt=2&invt=2&pn=1&np=1&pz={len(secids)}&ut={UT}"
+           f"&fields={fields}&secids={','.join(secids)}")
+    backoff = 1.0
+    while True:
+        positions = {}
+        try:
+            async for line in http_pool.stream_lines(url, read_timeout=STREAM_READ_TIMEOUT):
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    payload = json.loads(line[5:])
+                except ValueError:
+                    continue
+                backoff = 1.0
+                changed = table.apply(payload, positions)
+                if changed:
+                    on_tick(table, changed)
+            print(f"推送行情连接被关闭 ({len(secids)} 支)，重连")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"推送行情连接中断 ({len(secids)} 支): {e!r}，{backoff:.0f} 秒后重连")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_MAX)
+
+
+async def stream_quotes(codes, on_tick, table=None, fields=STREAM_FIELDS):
+    """
+    订阅推送行情，直到被取消；断线后指数退避重连，重连后的首包为全量快照
+    每条推送合并进 table 后回调 on_tick(table, {secid: 变化的字段})
+    """
+    table = table if table is not None else QuoteTable()
+    wanted = fields.split(",")
+    fields = ",".join(dict.fromkeys(["f12", "f13"] + wanted))
+    secids = list(dict.fromkeys(to_secid(c) for c in codes))
+    chunks = [secids[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(secids), STREAM_CHUNK_SIZE)]
+    await asyncio.gather(*(_stream_chunk(chunk, table, on_tick, fields) for chunk in chunks))
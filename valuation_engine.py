@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import asyncio
+import datetime
+
+import numpy as np
+
+from fund_valuation import get_fund_info
+from stock_quotes import fetch_stock_quotes, to_secid
+from stock_stream import stream_quotes
+from holdings_store import HoldingsStore, refresh_holdings
+from fetch_market_data import INDEX_SECIDS
+import http_pool
+
+
+class HoldingsMatrix:
+    """
+    基金 × 股票 持仓权重稀疏矩阵，按 COO 三元组存储（rows 基金行号 / cols 股票列号 / weights 权重，每条持仓一项）
+    matvec 先按 cols 取出股票值与权重相乘，再用 np.bincount 按 rows 求和，耗时与持仓条数成正比
+    holdings: {基金代码: [{'code': '601899', 'name': '紫金矿业', 'weight': 15.30}, ...]}
+    """
+
+    def __init__(self, holdings):
+        self.fund_codes = list(holdings)
+        self.fund_index = {code: i for i, code in enumerate(self.fund_codes)}
+        self.stock_codes = []
+        self.stock_index = {}
+        self.stock_names = {}
+        rows, cols, weights = [], [], []
+        for row, fund_code in enumerate(self.fund_codes):
+            for h in holdings[fund_code]:
+                col = self.stock_index.get(h['code'])
+                if col is None:
+                    col = self.stock_index[h['code']] = len(self.stock_codes)
+                    self.stock_codes.append(h['code'])
+                    self.stock_names[h['code']] = h.get('name', h['code'])
+                rows.append(row)
+                cols.append(col)
+                weights.append(float(h['weight']))
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.cols = np.asarray(cols, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    @property
+    def shape(self):
+        return len(self.fund_codes), len(self.stock_codes)
+
+    def matvec(self, vector):
+        """矩阵 × 向量：每支基金的 Σ 权重 × vector[股票]"""
+        return np.bincount(self.rows, weights=self.weights * vector[self.cols], minlength=len(self.fund_codes))
+
+    def estimate(self, changes, quoted):
+        """
+        changes: 每支股票的涨跌幅 (%)，按 stock_codes 顺序
+        quoted:  每支股票是否拿到了行情 (bool)
+        返回 (估算涨跌幅, 已知权重)；与 calculate_valuation 一致，按已知持仓部分同比例放大
+        """
+        weighted_change = self.matvec(np.where(quoted, changes, 0.0))
+        known_weight = self.matvec(quoted.astype(np.float64))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            est_change = np.where(known_weight > 0, weighted_change / known_weight, np.nan)
+        return est_change, known_weight
+
+
+class IncrementalEstimator:
+    """
+    推送行情驱动的增量估值：某支股票的涨跌幅变化时，只按该股票所在列更新持有它的基金的
+    加权涨跌幅和已知权重，结果与 HoldingsMatrix.estimate 一致
+    """
+
+    # 每累计这么多次增量更新后整体重算一次，消除浮点误差累积
+    RESYNC_EVERY = 10000
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        n_funds, n_stocks = matrix.shape
+        # 按列 (股票) 分组的 行号 / 权重，即 CSC 形式
+        order = np.argsort(matrix.cols, kind='stable')
+        bounds = np.searchsorted(matrix.cols[order], np.arange(n_stocks + 1))
+        self.col_rows = [matrix.rows[order[a:b]] for a, b in zip(bounds[:-1], bounds[1:])]
+        self.col_weights = [matrix.weights[order[a:b]] for a, b in zip(bounds[:-1], bounds[1:])]
+        self.secid_index = {to_secid(code): j for j, code in enumerate(matrix.stock_codes)}
+        self.changes = np.zeros(n_stocks, dtype=np.float64)
+        self.quoted = np.zeros(n_stocks, dtype=bool)
+        self.weighted = np.zeros(n_funds, dtype=np.float64)
+        self.known = np.zeros(n_funds, dtype=np.float64)
+        self.updates = 0
+
+    def update(self, secid, change):
+        """写入一支股票的最新涨跌幅，返回受影响的基金行号"""
+        j = self.secid_index.get(secid)
+        if j is None:
+            return np.zeros(0, dtype=np.int32)
+        rows, weights = self.col_rows[j], self.col_weights[j]
+        if self.quoted[j]:
+            np.add.at(self.weighted, rows, weights * (change - self.changes[j]))
+        else:
+            np.add.at(self.weighted, rows, weights * change)
+            np.add.at(self.known, rows, weights)
+            self.quoted[j] = True
+        self.changes[j] = change
+        self.updates += 1
+        if self.updates % self.RESYNC_EVERY == 0:
+            self.weighted = self.matrix.matvec(np.where(self.quoted, self.changes, 0.0))
+            self.known = self.matrix.matvec(self.quoted.astype(np.float64))
+        return rows
+
+    def estimate(self, row):
+        """返回 (估算涨跌幅或 None, 已知权重)"""
+        known = self.known[row]
+        return (float(self.weighted[row] / known) if known > 0 else None), float(known)
+
+
+async def fetch_stock_change_vector(stock_codes):
+    """每支股票只请求一次（批量并发拉取），返回 (涨跌幅数组, 是否取到数组)"""
+    secids = [to_secid(c) for c in stock_codes]
+    rows = await fetch_stock_quotes(secids, fields="f3")
+    quotes = {secid: row['f3'] for secid, row in rows.items() if isinstance(row.get('f3'), (int, float))}
+    changes = np.array([quotes.get(s, 0.0) for s in secids], dtype=np.float64)
+    quoted = np.array([s in quotes for s in secids], dtype=bool)
+    return changes, quoted
+
+
+async def estimate_funds(holdings, prev_navs=None):
+    """
+    批量估算基金涨跌幅及净值
+    prev_navs: {基金代码: 上一交易日净值}，提供时一并计算估算净值
+    返回 {基金代码: {'change': 估算涨跌幅, 'nav': 估算净值或 None, 'knownWeight': 已知权重}}
+    """
+    matrix = holdings if isinstance(holdings, HoldingsMatrix) else HoldingsMatrix(holdings)
+    changes, quoted = await fetch_stock_change_vector(matrix.stock_codes)
+    est_change, known_weight = matrix.estimate(changes, quoted)
+
+    navs = np.array([(prev_navs or {}).get(code, np.nan) for code in matrix.fund_codes], dtype=np.float64)
+    est_nav = navs * (1 + est_change / 100)
+
+    result = {}
+    for i, code in enumerate(matrix.fund_codes):
+        change = est_change[i]
+        nav = est_nav[i]
+        result[code] = {
+            'change': None if np.isnan(change) else round(float(change), 4),
+            'nav': None if np.isnan(nav) else round(float(nav), 4),
+            'knownWeight': round(float(known_weight[i]), 2),
+        }
+    return result
+
+
+async def run_live(matrix, names, prev_navs):
+    """订阅持仓股票及大盘指数的推送行情，每个推送到达时增量重算受影响的基金并输出"""
+    estimator = IncrementalEstimator(matrix)
+    index_names = {}
+
+    def on_tick(table, changed):
+        now = datetime.datetime.now().strftime('%H:%M:%S')
+        touched = set()
+        for secid, delta in changed.items():
+            change = table.change(secid)
+            if secid in INDEX_SECIDS:
+                index_names.setdefault(secid, table.rows[secid].get('f14', secid))
+                if change is not None:
+                    print(f"{now} [指数] {index_names[secid]:<8} {change:>+7.2f}%")
+            if 'f3' in delta and change is not None:
+                touched.update(estimator.update(secid, change).tolist())
+        for row in sorted(touched):
+            code = matrix.fund_codes[row]
+            change, known = estimator.estimate(row)
+            if change is None:
+                continue
+            nav = prev_navs.get(code)
+            nav_str = f"{nav * (1 + change / 100):>10.4f}" if nav else f"{'-':>10}"
+            print(f"{now} {code:<8} {names.get(code, '-'):<25} {known:>7.2f}% {change:>+7.2f}% {nav_str}")
+
+    print(f"订阅推送行情: 基金 {matrix.shape[0]} 支, 股票 {matrix.shape[1]} 支, 指数 {len(INDEX_SECIDS)} 个 (Ctrl+C 退出)")
+    await stream_quotes(list(estimator.secid_index) + INDEX_SECIDS, on_tick)
+
+
+async def main():
+    """
+    用法:
+        python valuation_engine.py holdings.json
+        python valuation_engine.py 021534 015968 ...    从本地持仓库读取持仓（有新报告期时自动更新）
+        python valuation_engine.py --live 021534 ...    订阅推送行情，每个推送到达时增量更新估值
+    holdings.json: {"021534": [{"code": "601899", "name": "紫金矿业", "weight": 15.30}, ...], ...}
+    """
+    args = sys.argv[1:]
+    live = "--live" in args
+    args = [a for a in args if a != "--live"]
+    if not args:
+        print(main.__doc__)
+        return
+    if os.path.exists(args[0]):
+        with open(args[0], encoding="utf-8") as f:
+            holdings = json.load(f)
+    else:
+        store = HoldingsStore()
+        await refresh_holdings(store, args)
+        holdings = store.all_holdings(args)
+        store.close()
+        if not holdings:
+            print("本地持仓库中没有这些基金的持仓")
+            return
+
+    matrix = HoldingsMatrix(holdings)
+    infos = await asyncio.gather(*(get_fund_info(code) for code in matrix.fund_codes))
+    prev_navs = {code: float(info['dwjz']) for code, info in zip(matrix.fund_codes, infos) if info}
+    names = {code: info['name'] for code, info in zip(matrix.fund_codes, infos) if info}
+
+    if live:
+        try:
+            await run_live(matrix, names, prev_navs)
+        finally:
+            await http_pool.aclose()
+        return
+
+    result = await estimate_funds(matrix, prev_navs)
+    await http_pool.aclose()
+
+    print(f"\n--- 持仓估值批量计算 ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}) ---")
+    print(f"基金 {matrix.shape[0]} 支, 去重后股票 {matrix.shape[1]} 支")
+    print(f"{'代码':<10} {'基金名称':<25} {'已知权重':>8} {'估算涨跌':>8} {'估算净值':>10}")
+    print("-" * 70)
+    for code in matrix.fund_codes:
+        r = result[code]
+        change = f"{r['change']:>+7.2f}%" if r['change'] is not None else f"{'未获取':>8}"
+        nav = f"{r['nav']:>10.4f}" if r['nav'] is not None else f"{'-':>10}"
+        print(f"{code:<10} {names.get(code, '-'):<25} {r['knownWeight']:>7.2f}% {change} {nav}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass